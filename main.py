@@ -1,13 +1,48 @@
 """ Main application file """
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
+from src import assets
+from src.config import pool
+from src.cryptography import password_service
+from src.executor import db_executor
+from src.middleware import CompressionMiddleware, ETagMiddleware
 from src.router import router
 from src.hv_router import hv_router
+from src.tasks import reap_expired_sessions
+from src.templating import precompile_templates
+from src.write_queue import write_queue
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    assets.build()
+    precompile_templates()
+    session_reaper = asyncio.create_task(reap_expired_sessions())
+
+    yield
+
+    session_reaper.cancel()
+    try:
+        await session_reaper
+    except asyncio.CancelledError:
+        pass
+    password_service.shutdown()
+    await write_queue.close()
+    db_executor.shutdown()
+    pool.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ETagMiddleware)
+# outermost, so it sees the ETag headers it has to weaken
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(router)
 app.include_router(hv_router)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount(assets.ASSETS_URL, assets.ImmutableStaticFiles(directory=assets.ASSETS_DIR, check_dir=False), name="assets")
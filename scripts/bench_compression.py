@@ -0,0 +1,170 @@
+"""
+Bytes on the wire and compression CPU for our real pages.
+
+    python -m scripts.bench_compression [--purchases 300] [--repeat 30]
+
+Renders the HTML and Hyperview screens from a scratch database seeded with one user's
+purchases, then compresses each body the ways CompressionMiddleware can: gzip and brotli
+(if installed) at a few levels, in one go and in streaming mode (a sync flush every
+STREAM_CHUNK_SIZE bytes, as stream_template sends them).
+"""
+import argparse
+import os
+from pathlib import Path
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+from scripts.check_query_plans import build_schema
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGES = [
+    ("/", "text/html"),
+    ("/today", "text/html"),
+    ("/purchases", "text/html"),
+    ("/me", "text/html"),
+    ("/stats", "text/html"),
+    ("/hv/today", "application/vnd.hyperview+xml"),
+    ("/hv/today?rows_only=true", "application/vnd.hyperview+xml"),
+    ("/hv/categories", "application/vnd.hyperview+xml"),
+]
+
+
+def gzip_whole(level: int):
+    def compress(body: bytes, chunk_size: int) -> bytes:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+    return compress
+
+
+def gzip_streamed(level: int):
+    def compress(body: bytes, chunk_size: int) -> bytes:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        out = []
+        for i in range(0, len(body), chunk_size):
+            out.append(compressor.compress(body[i:i + chunk_size]) + compressor.flush(zlib.Z_SYNC_FLUSH))
+        out.append(compressor.flush())
+        return b"".join(out)
+    return compress
+
+
+def brotli_whole(quality: int):
+    def compress(body: bytes, chunk_size: int) -> bytes:
+        return brotli.compress(body, quality=quality)
+    return compress
+
+
+def brotli_streamed(quality: int):
+    def compress(body: bytes, chunk_size: int) -> bytes:
+        compressor = brotli.Compressor(quality=quality)
+        out = []
+        for i in range(0, len(body), chunk_size):
+            out.append(compressor.process(body[i:i + chunk_size]) + compressor.flush())
+        out.append(compressor.finish())
+        return b"".join(out)
+    return compress
+
+
+def codecs():
+    yield "gzip-1", gzip_whole(1)
+    yield "gzip-6", gzip_whole(6)
+    yield "gzip-9", gzip_whole(9)
+    yield "gzip-6 stream", gzip_streamed(6)
+    if brotli is not None:
+        yield "br-1", brotli_whole(1)
+        yield "br-4", brotli_whole(4)
+        yield "br-11", brotli_whole(11)
+        yield "br-4 stream", brotli_streamed(4)
+
+
+def seed(db_path: str, user_id: int, purchases: int):
+    conn = sqlite3.connect(db_path)
+    now = int(time.time())
+    with conn:
+        for name in ("Groceries", "Eating out", "Transport"):
+            conn.execute("INSERT INTO category (name, user_id) VALUES (?, ?);", (name, user_id))
+        conn.executemany(
+            """INSERT INTO purchase (amount, currency, purchased_at, timezone, user_id)
+            VALUES (?, 'TWD', ?, 'Asia/Taipei', ?);""",
+            [
+                # a third of them today so /today and the hv rows have something to show
+                (random.randint(30, 900), now - random.randint(0, 3600 * 8 if i % 3 == 0 else 86400 * 60), user_id)
+                for i in range(purchases)
+            ]
+        )
+    conn.close()
+
+
+def fetch_pages(purchases: int) -> dict:
+    # imported here so they pick up the scratch DB_PATH
+    from fastapi.testclient import TestClient
+    import main
+
+    bodies = {}
+    with TestClient(main.app) as client:
+        response = client.post("/register", data={"email": "bench@example.com", "password": "bench"}, follow_redirects=False)
+        client.cookies.set("session-id", response.cookies.get("session-id"))
+        seed(os.environ["DB_PATH"], user_id=1, purchases=purchases)
+
+        for path, accept in PAGES:
+            response = client.get(path, headers={"accept": accept, "accept-encoding": "identity"})
+            bodies[path] = response.content
+    return bodies
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--purchases", type=int, default=300, help="purchases to seed")
+    parser.add_argument("--repeat", type=int, default=30, help="timing runs per page and codec")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = str(Path(tmp) / "bench.sqlite3")
+        build_schema(os.environ["DB_PATH"])
+        bodies = fetch_pages(args.purchases)
+
+    from src.middleware import COMPRESSION_MIN_SIZE
+    from src.templating import STREAM_CHUNK_SIZE
+
+    if brotli is None:
+        print("brotli isn't installed, only gzip is measured\n")
+
+    print(f"{'page':<28} {'codec':<14} {'bytes':>8} {'ratio':>6} {'median us':>10}")
+    totals = {}
+    for path, body in bodies.items():
+        print(f"{path:<28} {'identity':<14} {len(body):>8} {'1.00':>6} {'':>10}")
+        totals.setdefault("identity", [0, 0.0])[0] += len(body)
+        if len(body) < COMPRESSION_MIN_SIZE:
+            print(f"{'':<28} under COMPRESSION_MIN_SIZE, sent as is")
+            continue
+
+        for name, compress in codecs():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                compressed = compress(body, STREAM_CHUNK_SIZE)
+                timings.append(time.perf_counter() - start)
+            median_us = statistics.median(timings) * 1e6
+            total = totals.setdefault(name, [0, 0.0])
+            total[0] += len(compressed)
+            total[1] += median_us
+            print(f"{'':<28} {name:<14} {len(compressed):>8} {len(body) / len(compressed):>6.2f} {median_us:>10.0f}")
+
+    print(f"\n{'all pages':<28} {'codec':<14} {'bytes':>8} {'ratio':>6} {'total us':>10}")
+    identity = totals["identity"][0]
+    for name, (size, micros) in totals.items():
+        print(f"{'':<28} {name:<14} {size:>8} {identity / size:>6.2f} {micros:>10.0f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Time and memory to turn a purchase list query into Python objects.
+
+    python -m scripts.bench_row_models [--rows 10000] [--repeat 20]
+
+Seeds a scratch database with one user's purchases and fetches them all the ways the
+code base has built rows: sqlite3.Row copied into a dict with purchased_at decoded (the
+old repository functions), that dict unpacked into a plain @dataclass (the old models),
+SimpleNamespace(**row), and the slotted models built straight from the cursor tuples by
+src.models.rows, with purchased_at decoded eagerly and lazily. Plain tuples with no
+row factory at all are the floor. Every strategy runs the
+same query. "fetch" is just building the list, "fetch+format" also strftime()s every
+purchased_at like the list templates do. Memory is the tracemalloc peak of one fetch
+and what the resulting list still holds.
+"""
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+import gc
+import os
+from pathlib import Path
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Optional
+
+from scripts.check_query_plans import build_schema
+
+QUERY = """
+    SELECT purchase_id, amount, currency, purchased_at, timezone, user_id, bucket_id
+    FROM purchase
+    WHERE user_id = ?
+    ORDER BY purchased_at DESC;
+"""
+USER_ID = 1
+
+
+@dataclass
+class DictPurchase:
+    """Purchase as it was before the models were slotted"""
+    purchase_id: int
+    amount: Optional[int] = None
+    currency: Optional[str] = None
+    purchased_at: Optional[datetime] = None
+    timezone: Optional[str] = None
+    user_id: Optional[int] = None
+    bucket_id: Optional[int] = None
+    bucket_name: Optional[str] = None
+
+
+def seed(db_path: str, rows: int):
+    conn = sqlite3.connect(db_path)
+    now = int(time.time())
+    with conn:
+        conn.execute("INSERT INTO user (user_id, email, hashed_password) VALUES (?, 'bench@example.com', '');", (USER_ID, ))
+        conn.executemany(
+            """INSERT INTO purchase (amount, currency, purchased_at, timezone, user_id)
+            VALUES (?, 'TWD', ?, 'Asia/Taipei', ?);""",
+            [(random.randint(30, 900), now - random.randint(0, 86400 * 365), USER_ID) for _ in range(rows)]
+        )
+    conn.close()
+
+
+def strategies():
+    from src.models.purchase import Purchase, purchase_factory
+    from src.models.rows import model_factory
+    from src.respository.timestamps import from_epoch
+
+    def decoded(row) -> dict:
+        purchase = dict(row)
+        purchase["purchased_at"] = from_epoch(purchase["purchased_at"])
+        return purchase
+
+    def rows(conn):
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        return cursor.execute(QUERY, (USER_ID, )).fetchall()
+
+    def with_factory(factory):
+        def fetch(conn):
+            cursor = conn.cursor()
+            cursor.row_factory = factory
+            return cursor.execute(QUERY, (USER_ID, )).fetchall()
+        return fetch
+
+    yield "plain tuples (floor)", with_factory(None)
+    yield "Row -> dict", lambda conn: [decoded(row) for row in rows(conn)]
+    yield "Row -> dict -> dataclass", lambda conn: [DictPurchase(**decoded(row)) for row in rows(conn)]
+    yield "Row -> SimpleNamespace", lambda conn: [SimpleNamespace(**row) for row in rows(conn)]
+    yield "slots, eager datetime", with_factory(model_factory(Purchase, {"purchased_at": from_epoch}))
+    yield "slots, lazy (purchase_factory)", with_factory(purchase_factory)
+
+
+def purchased_at(item):
+    return item["purchased_at"] if isinstance(item, dict) else item.purchased_at
+
+
+def format_all(items):
+    for item in items:
+        value = item[3] if isinstance(item, tuple) else purchased_at(item)
+        if isinstance(value, int):
+            value = datetime.fromtimestamp(value)
+        value.strftime("%b %d %H:%M")
+
+
+def timed(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def measure_memory(fetch, conn):
+    gc.collect()
+    tracemalloc.start()
+    items = fetch(conn)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return peak, retained
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="purchases to seed")
+    parser.add_argument("--repeat", type=int, default=20, help="timing runs per strategy")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_PATH"] = str(Path(tmp) / "bench.sqlite3")
+        build_schema(os.environ["DB_PATH"])
+        seed(os.environ["DB_PATH"], args.rows)
+        conn = sqlite3.connect(os.environ["DB_PATH"])
+
+        print(f"{args.rows} purchases, median of {args.repeat} runs\n")
+        print(f"{'strategy':<32} {'fetch ms':>9} {'+format ms':>11} {'peak KB':>9} {'kept KB':>9}")
+        for name, fetch in strategies():
+            fetch(conn)  # warm the page cache and the factory's shape
+            fetch_ms = timed(lambda: fetch(conn), args.repeat)
+            format_ms = timed(lambda: format_all(fetch(conn)), args.repeat)
+            peak, retained = measure_memory(fetch, conn)
+            print(f"{name:<32} {fetch_ms:>9.2f} {format_ms:>11.2f} {peak / 1024:>9.0f} {retained / 1024:>9.0f}")
+        conn.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
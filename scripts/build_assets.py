@@ -0,0 +1,33 @@
+"""
+Fingerprints, precompresses and resizes everything under static/ into static/dist.
+
+    python -m scripts.build_assets [--prune]
+
+The app also does this at startup, but only new or changed files cost anything, so
+running it as a deploy step just moves the first build out of the boot path.
+--prune deletes built files that no longer come from anything in static/.
+"""
+import argparse
+import sys
+
+from src import assets
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prune", action="store_true", help="delete stale built files")
+    args = parser.parse_args(argv)
+
+    manifest = assets.build()
+    print(f"{len(manifest)} assets in {assets.MANIFEST_PATH}")
+    if not assets.brotli:
+        print("brotli isn't installed, only .gz files were written")
+
+    if args.prune:
+        print(f"pruned {assets.prune(manifest)} stale files")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Runs EXPLAIN QUERY PLAN on every SQL statement in src/respository and src/models
+against a scratch database built from src/sql/migrations.
+
+Fails when a statement doesn't prepare against the current schema, or when its plan
+SCANs a table, including SCAN ... USING [COVERING] INDEX, which walks the whole index.
+Only SEARCH is bounded. Statements that are meant to scan are listed in ALLOWED_SCANS by
+module.function, with the reason. Placeholders in f-string SQL that name module level SQL
+constants are filled in, any other placeholder is planned as *.
+
+    python -m scripts.check_query_plans
+"""
+import argparse
+import ast
+from dataclasses import dataclass
+from pathlib import Path
+import re
+import sqlite3
+import sys
+import tempfile
+
+from yoyo import get_backend, read_migrations
+
+ROOT = Path(__file__).resolve().parent.parent
+SOURCE_DIRS = [ROOT / "src" / "respository", ROOT / "src" / "models"]
+MIGRATIONS_DIR = ROOT / "src" / "sql" / "migrations"
+
+NAMED_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)")
+# CTEs and subqueries that sqlite evaluates on its own, scanning their results is fine
+INTERMEDIATE = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (.+)$")
+
+# module.function -> why it's fine for its statements to scan
+ALLOWED_SCANS = {
+    "spend_summary.rebuild": "rebuilds both summary tables from every purchase, maintenance only",
+}
+
+
+@dataclass
+class Statement:
+    path: Path
+    line: int
+    sql: str
+    name: str
+
+
+def _literal_sql(node: ast.AST, constants: dict):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif isinstance(value, ast.FormattedValue) and isinstance(value.value, ast.Name) \
+                    and value.value.id in constants:
+                # f"... {_EXPECTED_DAYS} ..." -> the constant's SQL
+                parts.append(constants[value.value.id])
+            else:
+                # f"SELECT {columns} FROM ..." -> plan it as SELECT *
+                parts.append("*")
+        return "".join(parts)
+
+    return None
+
+
+def _module_constants(tree: ast.Module) -> dict:
+    """Module level NAME = "SQL" (or f-strings of those), in the order they're defined"""
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            sql = _literal_sql(node.value, constants)
+            if sql is not None:
+                constants[node.targets[0].id] = sql
+    return constants
+
+
+def _owners(tree: ast.Module) -> dict:
+    """node -> module.function of the innermost function it's in"""
+    owners = {}
+    # ast.walk is breadth first, so nested functions overwrite their outer one
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for child in ast.walk(node):
+                owners[child] = node.name
+    return owners
+
+
+def collect_statements():
+    statements = []
+    for source_dir in SOURCE_DIRS:
+        for path in sorted(source_dir.glob("*.py")):
+            tree = ast.parse(path.read_text(), filename=str(path))
+            constants = _module_constants(tree)
+            owners = _owners(tree)
+            for node in ast.walk(tree):
+                if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+                    continue
+                if node.func.attr not in ("execute", "executemany") or not node.args:
+                    continue
+
+                sql = _literal_sql(node.args[0], constants)
+                if not sql or sql.lstrip().upper().startswith("PRAGMA"):
+                    continue
+
+                name = f"{path.stem}.{owners.get(node, '<module>')}"
+                statements.append(Statement(path=path, line=node.lineno, sql=sql, name=name))
+
+    return sorted(statements, key=lambda statement: (str(statement.path), statement.line))
+
+
+def build_schema(db_path: str):
+    backend = get_backend(f"sqlite:///{db_path}")
+    migrations = read_migrations(str(MIGRATIONS_DIR))
+    with backend.lock():
+        backend.apply_migrations(backend.to_apply(migrations))
+
+
+def bind_nulls(sql: str):
+    names = NAMED_PARAM.findall(sql)
+    if names:
+        return {name: None for name in names}
+    return (None, ) * sql.count("?")
+
+
+def explain(conn: sqlite3.Connection, sql: str):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", bind_nulls(sql)).fetchall()
+    return [row[3] for row in rows]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args(argv)
+
+    scans = []
+    errors = []
+    allowed = set()
+    statements = collect_statements()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "plans.sqlite3")
+        build_schema(db_path)
+        conn = sqlite3.connect(db_path)
+
+        for statement in statements:
+            location = f"{statement.path.relative_to(ROOT)}:{statement.line}"
+            try:
+                plan = explain(conn, statement.sql)
+            except sqlite3.Error as e:
+                errors.append(location)
+                print(f"ERROR {location}: {e}")
+                continue
+
+            intermediates = {m.group(1) for m in map(INTERMEDIATE.match, plan) if m}
+            full_scans = [
+                detail for detail in plan
+                if FULL_SCAN.match(detail) and detail[len("SCAN "):] not in intermediates
+                ]
+            if full_scans and statement.name in ALLOWED_SCANS:
+                allowed.add(statement.name)
+                print(f"allow {location}: {'; '.join(full_scans)} ({ALLOWED_SCANS[statement.name]})")
+            elif full_scans:
+                scans.append(location)
+                print(f"SCAN  {location}: {'; '.join(full_scans)}")
+            else:
+                print(f"ok    {location}: {'; '.join(plan) or 'no table access'}")
+
+        conn.close()
+
+    for name in sorted(ALLOWED_SCANS.keys() - allowed):
+        print(f"note  {name} is in ALLOWED_SCANS but no longer scans")
+
+    print(f"\n{len(statements)} statements, {len(scans)} full table scans, {len(errors)} errors")
+
+    if scans or errors:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Sends more concurrent requests than there are pooled readers and fails unless every one
+of them succeeds well inside the pool timeout.
+
+    python -m scripts.check_request_concurrency [--requests 24] [--readers 4]
+
+Runs the app in process against a scratch database with one registered user. A request
+that held on to its pooled reader across an await would leave the database threads
+waiting for readers that only get released by work queued behind them, and the extra
+requests would fail with "no read connection available".
+"""
+import argparse
+import asyncio
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+# handlers that make several database calls per request
+PATHS = ["/stats", "/hv/today"]
+
+
+async def run(requests: int) -> int:
+    import httpx
+    import main
+    from src.config import pool
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+            response = await client.post("/register", data={"email": "check@example.com", "password": "check"})
+            client.cookies.set("session-id", response.cookies.get("session-id"))
+
+            paths = [PATHS[index % len(PATHS)] for index in range(requests)]
+            start = time.perf_counter()
+            responses = await asyncio.gather(
+                *[client.get(path, headers={"accept": "application/vnd.hyperview+xml"}) for path in paths]
+            )
+            elapsed = time.perf_counter() - start
+
+    failed = [(path, response.status_code) for path, response in zip(paths, responses) if response.status_code != 200]
+    print(f"{requests} requests, {pool.read_pool_size} pooled readers, {elapsed:.2f}s")
+    for path, status in failed:
+        print(f"FAILED {path}: {status}")
+
+    if failed or elapsed >= pool.timeout:
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=24, help="requests sent at once")
+    parser.add_argument("--readers", type=int, default=4, help="DB_READ_POOL_SIZE for the run")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # the pool and the executor are module singletons, configured before they're imported
+        os.environ["DB_PATH"] = str(Path(tmp) / "concurrency.sqlite3")
+        os.environ["DB_READ_POOL_SIZE"] = str(args.readers)
+        os.environ["DB_POOL_TIMEOUT"] = "2"
+
+        from scripts.check_query_plans import build_schema
+        build_schema(os.environ["DB_PATH"])
+        return asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Rebuilds bucket_month_spend and bucket_day_spend from the purchase table and
+checks that they agree with it.
+
+    python -m scripts.rebuild_spend_summaries [--verify-only]
+
+The triggers on purchase keep the summaries exact from then on. Run this after
+importing data with the triggers off, or after changing a timezone_offset row
+if some purchases were written without a local_day.
+Exits 1 if any summary row is still out of line with purchase.
+"""
+import argparse
+import sys
+
+from src.config import pool
+from src.respository import spend_summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verify-only", action="store_true", help="report drift without rebuilding")
+    args = parser.parse_args(argv)
+
+    with pool.writer() as conn:
+        if not args.verify_only:
+            spend_summary.rebuild(conn)
+            print("rebuilt bucket_month_spend and bucket_day_spend")
+
+        drift = spend_summary.find_drift(conn)
+
+    pool.close()
+
+    for line in drift:
+        print(line)
+    print(f"{len(drift)} summary rows out of line with purchase")
+
+    return 1 if drift else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Per-user purchase columns in NumPy for the stats pages and the hv today screen.
+A user's purchases are read once into three parallel arrays (local time, amount,
+bucket_id) and every chart is a vectorised pass over a slice of them. The cached
+columns are reloaded once the user's data_version has moved on.
+"""
+from collections import OrderedDict
+from datetime import date, datetime
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src import utils
+from src.executor import db_executor
+
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+
+ROLLING_WINDOWS = (7, 30)
+PERCENTILES = (50, 75, 90, 99)
+
+
+def _local_seconds(epochs: np.ndarray, zone_codes: np.ndarray, zone_names: np.ndarray) -> np.ndarray:
+    """Wall-clock seconds for every purchase, looking offsets up once per zone and UTC day"""
+    local = epochs.copy()
+    days = epochs // utils.SECONDS_PER_DAY
+    for code, zone_name in enumerate(zone_names):
+        in_zone = zone_codes == code
+        zone_days, inverse = np.unique(days[in_zone], return_inverse=True)
+        offsets = [utils.get_day_offset(zone_name, int(day)) for day in zone_days]
+
+        if None not in offsets:
+            local[in_zone] += np.array(offsets, dtype=np.int64)[inverse]
+            continue
+
+        # a DST change somewhere in the data, do those rows one by one
+        zone = utils.get_zone(zone_name)
+        for i in np.flatnonzero(in_zone):
+            epoch = int(epochs[i])
+            local[i] = epoch + int(datetime.fromtimestamp(epoch, zone).utcoffset().total_seconds())
+
+    return local
+
+
+class PurchaseColumns:
+    """One user's purchases as arrays sorted by local time"""
+
+    __slots__ = ("local", "amount", "bucket_id")
+
+    def __init__(self, local: np.ndarray, amount: np.ndarray, bucket_id: np.ndarray):
+        self.local = local
+        self.amount = amount
+        self.bucket_id = bucket_id
+
+    @classmethod
+    def from_rows(cls, rows: List[sqlite3.Row]) -> "PurchaseColumns":
+        if not rows:
+            empty = np.empty(0, dtype=np.int64)
+            return cls(empty, empty, empty)
+
+        epochs, amounts, bucket_ids, zones = zip(*rows)
+        epochs = np.array(epochs, dtype=np.int64)
+        zone_names, zone_codes = np.unique(np.array(zones), return_inverse=True)
+
+        local = _local_seconds(epochs, zone_codes, zone_names)
+        order = np.argsort(local, kind="stable")
+
+        return cls(
+            local[order],
+            np.array(amounts, dtype=np.int64)[order],
+            np.array(bucket_ids, dtype=np.int64)[order]
+        )
+
+    def __len__(self):
+        return len(self.local)
+
+    def _between(self, first_day: date, last_day: date) -> slice:
+        """Positions of the purchases made on local days first_day to last_day, both inclusive"""
+        start = (first_day.toordinal() - utils.EPOCH_ORDINAL) * utils.SECONDS_PER_DAY
+        end = (last_day.toordinal() - utils.EPOCH_ORDINAL + 1) * utils.SECONDS_PER_DAY
+        return slice(*np.searchsorted(self.local, [start, end]))
+
+    def daily_totals(self, first_day: date, last_day: date) -> np.ndarray:
+        """Spend per local day, including days with nothing"""
+        period = self._between(first_day, last_day)
+        first = first_day.toordinal() - utils.EPOCH_ORDINAL
+        days = self.local[period] // utils.SECONDS_PER_DAY - first
+        return np.bincount(days, weights=self.amount[period], minlength=(last_day - first_day).days + 1).astype(np.int64)
+
+    def weekday_totals(self, first_day: date, last_day: date) -> np.ndarray:
+        """Spend per weekday, Monday first"""
+        period = self._between(first_day, last_day)
+        # 1970-01-01 was a Thursday
+        weekdays = (self.local[period] // utils.SECONDS_PER_DAY + 3) % 7
+        return np.bincount(weekdays, weights=self.amount[period], minlength=7).astype(np.int64)
+
+    def hour_totals(self, first_day: date, last_day: date) -> np.ndarray:
+        """Spend per local hour of the day"""
+        period = self._between(first_day, last_day)
+        hours = self.local[period] % utils.SECONDS_PER_DAY // 3600
+        return np.bincount(hours, weights=self.amount[period], minlength=24).astype(np.int64)
+
+    def bucket_totals(self, first_day: date, last_day: date) -> Dict[int, int]:
+        period = self._between(first_day, last_day)
+        bucket_ids, inverse = np.unique(self.bucket_id[period], return_inverse=True)
+        totals = np.bincount(inverse, weights=self.amount[period], minlength=len(bucket_ids)).astype(np.int64)
+        return dict(zip(bucket_ids.tolist(), totals.tolist()))
+
+    def rolling_totals(self, first_day: date, last_day: date, window: int) -> np.ndarray:
+        """Spend over the window days ending on each day, counting purchases from before first_day"""
+        daily = self.daily_totals(date.fromordinal(first_day.toordinal() - window + 1), last_day)
+        running = np.concatenate(([0], np.cumsum(daily)))
+        return running[window:] - running[:-window]
+
+    def percentiles(self, first_day: date, last_day: date) -> Dict[str, List[int]]:
+        """Purchase size and daily spend percentiles, empty when there's nothing in the period"""
+        amounts = self.amount[self._between(first_day, last_day)]
+        if not len(amounts):
+            return {"purchase": [], "daily": []}
+
+        daily = self.daily_totals(first_day, last_day)
+        return {
+            "purchase": np.percentile(amounts, PERCENTILES).round().astype(np.int64).tolist(),
+            "daily": np.percentile(daily, PERCENTILES).round().astype(np.int64).tolist(),
+        }
+
+    def summarize(self, first_day: date, last_day: date) -> dict:
+        """Everything the charts need for a period, as plain lists so it renders and serialises as is"""
+        return {
+            "weekday_totals": self.weekday_totals(first_day, last_day).tolist(),
+            "hour_totals": self.hour_totals(first_day, last_day).tolist(),
+            "bucket_totals": self.bucket_totals(first_day, last_day),
+            "rolling": {
+                window: self.rolling_totals(first_day, last_day, window).tolist() for window in ROLLING_WINDOWS
+            },
+            "percentile_ranks": list(PERCENTILES),
+            "percentiles": self.percentiles(first_day, last_day),
+        }
+
+    def recent(self, day: date) -> dict:
+        """Rolling totals ending on day and the median purchase over the longest window, for the today screens"""
+        window_start = date.fromordinal(day.toordinal() - max(ROLLING_WINDOWS) + 1)
+        amounts = self.amount[self._between(window_start, day)]
+        return {
+            "rolling": {window: int(self.rolling_totals(day, day, window)[0]) for window in ROLLING_WINDOWS},
+            "median_purchase": int(np.median(amounts).round()) if len(amounts) else None,
+        }
+
+
+def load_user_columns(conn: sqlite3.Connection, user_id: int) -> PurchaseColumns:
+    rows = conn.execute(
+        """
+        SELECT purchased_at, amount, COALESCE(bucket_id, 0), timezone
+        FROM purchase
+        WHERE user_id = :user_id
+        ORDER BY purchased_at;
+        """,
+        {"user_id": user_id}
+        ).fetchall()
+
+    return PurchaseColumns.from_rows(rows)
+
+
+class AnalyticsCache:
+    """
+    Bounded LRU of user_id -> (data_version, PurchaseColumns).
+    An entry is only used while it was loaded at the user's current data_version, which the
+    database triggers bump on every write to their purchases, categories and top ups, so
+    writes from other processes and cascading deletes are picked up without invalidate().
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, data_version: int) -> Optional[PurchaseColumns]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != data_version:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id: int, data_version: int, columns: PurchaseColumns):
+        with self._lock:
+            previous = self._entries.get(user_id)
+            # a slow load must not replace one made at a newer version
+            if previous is not None and previous[0] > data_version:
+                return
+            self._entries[user_id] = (data_version, columns)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+analytics_cache = AnalyticsCache(max_size=ANALYTICS_CACHE_SIZE)
+
+
+def invalidate(user_id: int):
+    """Frees the user's columns right away after a write, the data_version check doesn't need it"""
+    analytics_cache.invalidate(user_id)
+
+
+async def get_user_columns_async(user_id: int, data_version: Optional[int]) -> PurchaseColumns:
+    """
+    data_version is the one if_none_match read for the request (request.state.data_version).
+    Without one the columns are loaded but not cached.
+    """
+    if data_version is None:
+        return await db_executor.read(load_user_columns, user_id=user_id)
+
+    columns = analytics_cache.get(user_id, data_version)
+    if columns is not None:
+        return columns
+
+    # read after data_version, so the columns are never older than the version they're stored at
+    columns = await db_executor.read(load_user_columns, user_id=user_id)
+    analytics_cache.set(user_id, data_version, columns)
+    return columns
+
+
+async def summarize_async(user_id: int, first_day: date, last_day: date, data_version: Optional[int] = None) -> dict:
+    columns = await get_user_columns_async(user_id, data_version)
+    return columns.summarize(first_day, last_day)
+
+async def recent_async(user_id: int, day: date, data_version: Optional[int] = None) -> dict:
+    columns = await get_user_columns_async(user_id, data_version)
+    return columns.recent(day)
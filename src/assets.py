@@ -0,0 +1,200 @@
+"""
+Static asset pipeline.
+build() copies everything under static/ into static/dist with a content hash in the file
+name, writes .gz (and .br when the brotli package is installed) next to text assets and
+resized WebP variants next to images, and records it all in static/dist/manifest.json.
+ImmutableStaticFiles serves static/dist at /assets with year-long immutable caching.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from src.middleware import negotiate_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = Path("static")
+ASSETS_DIR = STATIC_DIR / "dist"
+ASSETS_URL = "/assets"
+MANIFEST_PATH = ASSETS_DIR / "manifest.json"
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".xml"}
+RESIZABLE = {".png", ".jpg", ".jpeg"}
+IMAGE_WIDTHS = (320, 640, 1280)
+WEBP_QUALITY = int(os.getenv("ASSET_WEBP_QUALITY", "80"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_manifest: Optional[Dict[str, str]] = None
+
+
+def _digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:12]
+
+
+def _tmp_path(path: Path) -> Path:
+    # every worker builds at startup, so don't let them share temp files
+    return path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+
+def _write(path: Path, content: bytes):
+    """Outputs are named after their content, so one that already exists is up to date"""
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(path)
+    tmp.write_bytes(content)
+    tmp.replace(path)
+
+
+def _compress(path: Path, content: bytes):
+    _write(path.with_name(path.name + ".gz"), gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write(path.with_name(path.name + ".br"), brotli.compress(content, quality=11))
+
+
+def _webp_variants(source: Path, name: str, digest: str, manifest: Dict[str, str]):
+    """img/cash.png -> img/cash.640w.webp in the manifest, one per width up to the original's"""
+    with Image.open(source) as image:
+        image.load()
+        widths = [width for width in IMAGE_WIDTHS if width < image.width] + [image.width]
+        stem = str(Path(name).with_suffix(""))
+        for width in widths:
+            # named after the source digest so an unchanged image is never resized again
+            built = f"{stem}.{digest}.{width}w.webp"
+            manifest[f"{stem}.{width}w.webp"] = built
+            target = ASSETS_DIR / built
+            if target.exists():
+                continue
+
+            height = round(image.height * width / image.width)
+            variant = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = _tmp_path(target)
+            variant.save(tmp, format="WEBP", quality=WEBP_QUALITY)
+            tmp.replace(target)
+
+
+def build() -> Dict[str, str]:
+    """
+    Builds static/dist from static/ and returns the manifest (logical name -> built name).
+    Incremental: only new or changed files do any work, so it's cheap to run on every startup.
+    """
+    manifest = {}
+    for source in sorted(STATIC_DIR.rglob("*")):
+        if not source.is_file() or ASSETS_DIR in source.parents:
+            continue
+
+        name = source.relative_to(STATIC_DIR).as_posix()
+        content = source.read_bytes()
+        digest = _digest(content)
+        built = str(Path(name).with_suffix(f".{digest}{source.suffix}"))
+
+        target = ASSETS_DIR / built
+        _write(target, content)
+        manifest[name] = built
+
+        if source.suffix in COMPRESSIBLE:
+            _compress(target, content)
+        elif source.suffix.lower() in RESIZABLE:
+            _webp_variants(source, name, digest, manifest)
+
+    ASSETS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(MANIFEST_PATH)
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    tmp.replace(MANIFEST_PATH)
+
+    global _manifest
+    _manifest = manifest
+    return manifest
+
+
+def prune(manifest: Dict[str, str]) -> int:
+    """Deletes built files the manifest no longer points at. Returns how many went."""
+    keep = {ASSETS_DIR / built for built in manifest.values()}
+    keep |= {path.with_name(path.name + suffix) for path in keep for suffix in (".gz", ".br")}
+    keep.add(MANIFEST_PATH)
+
+    removed = 0
+    for path in ASSETS_DIR.rglob("*"):
+        if path.is_file() and path not in keep and not path.name.endswith(".tmp"):
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def get_manifest() -> Dict[str, str]:
+    global _manifest
+    if _manifest is None:
+        try:
+            _manifest = json.loads(MANIFEST_PATH.read_text())
+        except (FileNotFoundError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def asset(name: str) -> str:
+    """URL for a file under static/, fingerprinted if it's been built"""
+    built = get_manifest().get(name)
+    if built is None:
+        return f"/static/{name}"
+    return f"{ASSETS_URL}/{built}"
+
+
+def srcset(name: str) -> str:
+    """srcset of the WebP variants of an image, e.g. for <source type="image/webp">"""
+    stem = str(Path(name).with_suffix(""))
+    prefix = f"{stem}."
+    entries = []
+    for logical, built in get_manifest().items():
+        if logical.startswith(prefix) and logical.endswith("w.webp"):
+            width = logical[len(prefix):-len("w.webp")]
+            if width.isdigit():
+                entries.append((int(width), f"{ASSETS_URL}/{built} {width}w"))
+    return ", ".join(entry for _, entry in sorted(entries))
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Serves fingerprinted assets, which never change under the same URL.
+    Picks the .br or .gz sibling when the client accepts it.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        accepted = Headers(scope=scope).get("accept-encoding", "")
+        media_type = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+        headers = {"Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+
+        variants = {
+            encoding: f"{full_path}{suffix}"
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz"))
+            if os.path.isfile(f"{full_path}{suffix}")
+        }
+        encoding = negotiate_encoding(accepted, variants) if variants else None
+        if encoding is not None:
+            compressed = variants[encoding]
+            return FileResponse(
+                compressed,
+                status_code=status_code,
+                headers={**headers, "Content-Encoding": encoding},
+                media_type=media_type,
+                stat_result=os.stat(compressed)
+            )
+
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers.update(headers)
+        return response
+
@@ -1,9 +1,168 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import os
+import queue
 import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("DB_PATH", "db.sqlite3")
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+
+class ConnectionPool:
+    """
+    Process-wide sqlite connections.
+    Keeps a bounded set of read-only connections and a single writer connection.
+    PRAGMAs are applied once when a connection is opened, not per use.
+    """
+
+    def __init__(self, path: str, read_pool_size: int, timeout: float):
+        self.path = path
+        self.read_pool_size = read_pool_size
+        self.timeout = timeout
+
+        self._idle_readers = queue.LifoQueue(maxsize=read_pool_size)
+        self._readers_opened = 0
+        self._readers_lock = threading.Lock()
+
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        self._bound = ContextVar("bound_reader", default=None)
+
+    def _open_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON;")
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)};")
+        return conn
+
+    def _open_reader(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON;")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)};")
+        return conn
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._idle_readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._readers_lock:
+            if self._readers_opened < self.read_pool_size:
+                # the writer makes sure the database exists and is in WAL mode
+                # before any read-only connection is opened
+                with self._writer_lock:
+                    if self._writer is None:
+                        self._writer = self._open_writer()
+                conn = self._open_reader()
+                self._readers_opened += 1
+                return conn
+
+        try:
+            return self._idle_readers.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no read connection available after {self.timeout}s")
+
+    def _release_reader(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle_readers.put_nowait(conn)
+
+    @contextmanager
+    def reader(self):
+        """
+        Borrow a read-only connection from the pool.
+        Inside bind_reader() (a request's unit of work) this is the bound connection instead,
+        so one request never holds more than one pooled reader.
+        """
+        bound = self._bound.get()
+        if bound is not None and not bound.closed:
+            with bound.borrow() as conn:
+                yield conn
+            return
+
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            self._release_reader(conn)
+
+    @contextmanager
+    def bind_reader(self, holder):
+        """
+        Routes reader() in this context to holder.borrow() until the block exits.
+        Threads started with a copy of the context (db_executor, FastAPI's threadpool) see it too.
+        """
+        token = self._bound.set(holder)
+        try:
+            yield holder
+        finally:
+            self._bound.reset(token)
+
+    @contextmanager
+    def dedicated_reader(self):
+        """
+        A read-only connection of its own, outside the pool, for long reads like exports.
+        Under WAL it doesn't block the writer, and it never holds up pooled readers.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._open_writer()
+        conn = self._open_reader()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def writer(self):
+        """
+        Borrow the writer connection.
+        Commits when the block exits cleanly and rolls back if it raises.
+        """
+        if not self._writer_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f"writer connection busy after {self.timeout}s")
+        try:
+            if self._writer is None:
+                self._writer = self._open_writer()
+            conn = self._writer
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+        finally:
+            self._writer_lock.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle_readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._readers_lock:
+            self._readers_opened = 0
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+pool = ConnectionPool(path=DB_PATH, read_pool_size=DB_READ_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
 
 
 def get_db():
-    conn = sqlite3.connect("db.sqlite3", check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    conn.execute("PRAGMA journal_mode = WAL;")
-    return conn
\ No newline at end of file
+    """Dependency that lends a pooled read-only connection for the request."""
+    with pool.reader() as conn:
+        yield conn
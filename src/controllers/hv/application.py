@@ -1,93 +1,84 @@
-from calendar import monthrange
-from datetime import date, datetime, timedelta, timezone
-import sqlite3
+from datetime import date, datetime, timezone
 from types import SimpleNamespace
 from zoneinfo import ZoneInfo
 
-from fastapi import Request
-from fastapi.templating import Jinja2Templates
+from fastapi import Request, Response
 
-from src import utils
+from src import analytics, utils
+from src.executor import db_executor
+from src.fragment_cache import fragment_cache
 from src.models.bucket import Bucket
+from src.models.purchase import purchase_factory
 from src.models.user import User
-from src.respository import purchase_repository
+from src.respository import purchase_repository, spend_summary
+from src.respository.timestamps import to_epoch
+from src.templating import templates
 
 
-templates = Jinja2Templates(directory="templates")
-
 async def get_today_context(user_id: int):
       
-    utc_date_today = datetime.now(timezone.utc)
-
-    local_date_today = utc_date_today.astimezone(ZoneInfo("Asia/Taipei"))
-
-    month_start = local_date_today.replace(day=1).date()
-
-    local_start_of_day = local_date_today.replace(hour=0, minute=0, second=0)
-    utc_start_of_day =  local_start_of_day.astimezone(timezone.utc)
-
-    local_start_of_tomorrow = local_start_of_day + timedelta(days=1)
-    utc_start_of_tomorrow =  local_start_of_tomorrow.astimezone(timezone.utc)
-
-    buckets = Bucket.list_for_month(user_id=user_id, fields=["bucket_id", "name", "is_daily"])
-
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.row_factory = sqlite3.Row
-
-        cursor = conn.cursor()
-        cursor.execute("""
-                       SELECT b.bucket_id,
-                            b.name,
-                            b.is_daily,
-                            b.user_id,
-                            btu.month_start,
-                            btu.start_amount
-                        FROM bucket b
-                        JOIN bucket_month_top_up btu ON b.bucket_id = btu.bucket_id
-                        WHERE btu.month_start = ? 
-                        AND b.is_daily = 1 
-                        AND user_id is ?""", (month_start, user_id))
-       
-        row = cursor.fetchone()
-        if not row:
-            context={
-                "today_date": local_date_today,
-                "purchases": None,
-                "total_spent": None,
-                "daily_spending_bucket": None,
-                "buckets": buckets
-            }
-            
-            return context
-        
-        daily_spending_bucket = SimpleNamespace(**row)
-        
-        cursor.execute("""SELECT purchase.purchase_id,
-                            purchase.amount, purchase.currency,
-                            purchase.purchased_at, purchase.timezone,
-                            purchase.user_id,
-                            purchase.bucket_id as bucket_id,
-                            bucket.name as bucket_name 
-                       FROM purchase
-                       JOIN bucket USING (bucket_id)
-                       WHERE purchase.user_id = ?
-                       AND bucket.is_daily = ?
-                       AND purchased_at >= ? AND purchased_at < ?
-                       ORDER BY purchased_at DESC;""", (user_id, daily_spending_bucket.is_daily, utc_start_of_day, utc_start_of_tomorrow))
+    local_date_today = utils.get_local_today()
+    today = utils.boundaries.today()
+    this_month = utils.boundaries.this_month()
+
+    month_start = this_month.first_day
+    utc_start_of_day = today.utc_start
+    utc_start_of_tomorrow = today.utc_end
+
+    buckets = await Bucket.list_for_month_async(user_id=user_id, fields=["bucket_id", "name", "is_daily"])
+
+    row = await db_executor.fetchone("""
+                   SELECT b.bucket_id,
+                        b.name,
+                        b.is_daily,
+                        b.user_id,
+                        btu.month_start,
+                        btu.start_amount
+                    FROM bucket b
+                    JOIN bucket_month_top_up btu ON b.bucket_id = btu.bucket_id
+                    WHERE btu.month_start = ? 
+                    AND b.is_daily = 1 
+                    AND user_id is ?""", (month_start, user_id))
+
+    if not row:
+        context={
+            "today_date": local_date_today,
+            "purchases": None,
+            "total_spent": None,
+            "daily_spending_bucket": None,
+            "buckets": buckets
+        }
         
-        purchases = [SimpleNamespace(**row) for row in cursor.fetchall()]
+        return context
+    
+    daily_spending_bucket = SimpleNamespace(**row)
+    
+    purchases = await db_executor.fetchall("""SELECT purchase.purchase_id,
+                        purchase.amount, purchase.currency,
+                        purchase.purchased_at, purchase.timezone,
+                        purchase.user_id,
+                        purchase.bucket_id as bucket_id,
+                        bucket.name as bucket_name 
+                   FROM purchase
+                   JOIN bucket USING (bucket_id)
+                   WHERE purchase.user_id = ?
+                   AND bucket.is_daily = ?
+                   AND purchased_at >= ? AND purchased_at < ?
+                   ORDER BY purchased_at DESC;""",
+                   (user_id, daily_spending_bucket.is_daily, to_epoch(utc_start_of_day), to_epoch(utc_start_of_tomorrow)),
+                   row_factory=purchase_factory)
 
     if daily_spending_bucket:
         daily_spending_bucket.month = datetime.strptime(daily_spending_bucket.month_start, "%Y-%m-%d")
-        daily_spending_bucket.daily_amount = daily_spending_bucket.start_amount / monthrange(month_start.year, month_start.month)[1]   
+        daily_spending_bucket.daily_amount = daily_spending_bucket.start_amount / this_month.days
+
+    total_spent = await spend_summary.get_user_day_spend_async(
+        user_id=user_id,
+        day=today.first_day,
+        bucket_id=daily_spending_bucket.bucket_id
+        )
 
-    total_spent = 0
-    for purchase in purchases:
-        naive = datetime.strptime(purchase.purchased_at, "%Y-%m-%d %H:%M:%S")
-        utc_aware = naive.replace(tzinfo=timezone.utc)
-        purchase.purchased_at = utc_aware.astimezone(ZoneInfo(purchase.timezone))
-        total_spent += purchase.amount
+    utils.localize_rows(purchases)
 
     percent_remaining = 100 - (total_spent  /  daily_spending_bucket.daily_amount * 100)
     context = {
@@ -140,47 +131,56 @@ async def today(request: Request):
 
     local_today = utils.get_local_today()
     default_date, default_time = utils.get_form_default_date_time(local_today=local_today)
-    utc_today_start, utc_today_end = utils.get_today_utc_range(local_today)
+    today = utils.boundaries.today()
 
-    purchase_rows = purchase_repository.list_for_period(
-        user_id=current_user.user_id, 
-        period_start=utc_today_start,
-        period_end=utc_today_end
-        )
-        
-    purchases = [dict(row) for row in purchase_rows]
-    total_spent = 0
-    for purchase in purchases:
-        purchase["purchased_at"] = datetime.strptime(purchase["purchased_at"], "%Y-%m-%d %H:%M:%S")
-        purchase["purchased_at"] = purchase["purchased_at"].replace(tzinfo=timezone.utc).astimezone(ZoneInfo("Asia/Taipei"))
-        total_spent += purchase["amount"]
-
-    if request.query_params.get("rows_only") and request.query_params.get("rows_only") == "true":
+    async def rows_context():
+        purchase_rows = await purchase_repository.list_for_period_async(
+            user_id=current_user.user_id, 
+            period_start=today.utc_start,
+            period_end=today.utc_end
+            )
+        total_spent = await spend_summary.get_user_day_spend_async(user_id=current_user.user_id, day=today.first_day)
+        recent = await analytics.recent_async(
+            user_id=current_user.user_id, day=today.first_day, data_version=request.state.data_version
+            )
+
+        return {
+            "today_date": local_today,
+            "purchases": utils.localize_rows(purchase_rows, zone_name="Asia/Taipei"),
+            "total_spent": total_spent,
+            "recent": recent,
+            "daily_spending_bucket": None
+            }
+
+    # the app polls this, so the rows come from the fragment cache until the user's data changes
+    if request.query_params.get("rows_only") == "true" and request.state.data_version is not None:
+        content = await fragment_cache.render(
+            templates,
+            name="hv/_rows.xml",
+            user_id=current_user.user_id,
+            data_version=request.state.data_version,
+            build_context=rows_context,
+            params={"day": today.first_day.isoformat()}
+            )
+        return Response(content=content, headers={"Content-Type": content_type})
+
+    context = await rows_context()
+
+    if request.query_params.get("rows_only") == "true":
         return templates.TemplateResponse(
             request=request,
             name="hv/_rows.xml",
-            context={
-                "today_date": local_today,
-                "default_date": default_date,
-                "default_time": default_time,
-                "purchases": purchases,
-                "total_spent": total_spent,
-                "daily_spending_bucket": None
-                },
+            context=context,
             headers={"Content-Type": content_type}
         )
 
-    
     return templates.TemplateResponse(
         request=request,
         name="hv/today.xml",
         context={
-            "today_date": local_today,
+            **context,
             "default_date": default_date,
             "default_time": default_time,
-            "purchases": purchases,
-            "total_spent": total_spent,
-            "daily_spending_bucket": None
             },
         headers={"Content-Type": content_type}
     )
@@ -287,7 +287,7 @@ async def store(request: Request):
             )
 
     try:
-        purchase_repository.store(
+        await purchase_repository.store_async(
             amount=amount,
             currency="TWD",
             purchased_at=purchased_at,
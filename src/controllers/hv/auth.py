@@ -1,17 +1,16 @@
 
-import sqlite3
 import time
 import uuid
 
 from fastapi import Request
-from fastapi.templating import Jinja2Templates
 
-from src import cryptography
+from src.cryptography import password_service
 from src.models.user import User
-from src.respository.session import store_session
-from src.respository.user import get_user_with_password
+from src.respository.session import delete_session_async, store_session_async
+from src.respository.user import get_user_with_password_async
+from src.session_cache import session_cache
+from src.templating import templates
 
-templates = Jinja2Templates(directory="templates")
 
 async def login(request: Request):
     accept_header = request.headers.get("accept", "")
@@ -32,14 +31,13 @@ async def login(request: Request):
     if not password:
         errors["password"] =  "You need to enter your password."
 
-    with sqlite3.connect("db.sqlite3") as conn:
-        db_user = get_user_with_password(conn=conn, email=email)
+    db_user = await get_user_with_password_async(email=email)
 
     if not db_user:
         errors["email"] =  "You need to enter your email."
 
     if db_user:
-        if password and not cryptography.verify_password(plain_password=password, hashed_password=db_user["hashed_password"]):
+        if password and not await password_service.verify(plain_password=password, hashed_password=db_user["hashed_password"]):
             errors["password"] =  "You need to enter your password."
 
     if errors:
@@ -63,8 +61,7 @@ async def login(request: Request):
     token = str(uuid.uuid4())
     expires_at = int(time.time()) + (60 * 60 * 24 * 3)
 
-    with sqlite3.connect("db.sqlite3") as conn:
-        store_session(conn=conn, token=token, user_id=db_user.user_id, expires_at=expires_at)
+    await store_session_async(token=token, user_id=db_user.user_id, expires_at=expires_at)
 
     response = templates.TemplateResponse(
         request=request,
@@ -90,9 +87,8 @@ async def logout(request: Request):
     # if not request.state.user:
     #     return RedirectResponse(url="/signin", status_code=303)
         
-    with sqlite3.connect("db.sqlite3") as conn:
-        cursor = conn.cursor()        
-        cursor.execute("DELETE FROM session where session_id = ?;", (request.state.user.session_id,))
+    await delete_session_async(session_id=request.state.user.session_id)
+    session_cache.invalidate(request.cookies.get("session-id"))
 
     # response = RedirectResponse(url="/login", status_code=303)
     # response.delete_cookie("session-id")
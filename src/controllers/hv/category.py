@@ -1,39 +1,56 @@
 import calendar
-from datetime import datetime, timezone
-import sqlite3
 from typing import Annotated
-from zoneinfo import ZoneInfo
 from fastapi import Depends, Request, Response
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse
 
+from src import utils
 from src.models.bucket import Bucket
 from src.models.bucket_month_top_up import BucketMonthTopUp
 from src.respository.category import get_with_top_up, list_with_top_ups
 from src.respository import purchase_repository as purchase_repo
-from src.config import get_db
 from src.dependencies import is_user
+from src.executor import db_executor
+from src.fragment_cache import fragment_cache
+from src.templating import templates
 import logging
 
 logger = logging.getLogger(__name__)
 
-templates = Jinja2Templates(directory="templates")
 
 async def list(
-        request: Request, 
-        conn: Annotated[sqlite3.Connection, Depends(get_db)]
+        request: Request
         ):
     current_user = request.state.user
     if not current_user:
         return Response(status_code=401, content="not authenticated")
     
-    utc_date_today = datetime.now(timezone.utc)
+    month_start = utils.boundaries.this_month().first_day
 
-    local_date_today = utc_date_today.astimezone(ZoneInfo("Asia/Taipei"))
+    async def list_context():
+        category_rows = await db_executor.read(list_with_top_ups, month_start=month_start, user_id=current_user.user_id)
+        return {
+            "request": request,
+            "categories": category_rows,
+            "current_month": month_start
+            }
 
-    month_start = local_date_today.replace(day=1).date()
-    
     try:
-        category_rows = list_with_top_ups(conn=conn, month_start=month_start, user_id=current_user.user_id)
+        if request.state.data_version is not None:
+            content = await fragment_cache.render(
+                templates,
+                name="hv/categories/index.xml",
+                user_id=current_user.user_id,
+                data_version=request.state.data_version,
+                build_context=list_context,
+                # the layout's styles depend on the screen size header
+                params={
+                    "month_start": month_start.isoformat(),
+                    "dimensions": request.headers.get("x-hyperview-dimensions", "")
+                    }
+                )
+            return HTMLResponse(content=content)
+
+        context = await list_context()
     except Exception as e:
         logger.error(f"DB error getting categories: {e}", exc_info=True)
         return Response(status_code=500, content="something went wrong on our end")
@@ -41,17 +58,13 @@ async def list(
     return templates.TemplateResponse(
         request=request,
         name="hv/categories/index.xml",
-        context={
-            "categories": category_rows,
-            "current_month": month_start
-            }
+        context=context
         )
 
 
 async def show(
         request: Request, 
         current_user: Annotated[any, Depends(is_user)],
-        conn: Annotated[sqlite3.Connection, Depends(get_db)],
         category_id: int
         ):
 
@@ -59,10 +72,10 @@ async def show(
         return Response(status_code=401, content="not authenticated")
     
     try:
-        category_row = conn.execute(
+        category_row = await db_executor.fetchone(
             "SELECT * FROM category WHERE category_id = :category_id;", 
             {"category_id": category_id}
-            ).fetchone()
+            )
     except Exception as e:
         logger.error(f"DB error getting category {category_id}: {e}", exc_info=True)
 
@@ -77,7 +90,6 @@ async def show(
 async def edit(
         request: Request,
         current_user: Annotated[any, Depends(is_user)],
-        conn: Annotated[sqlite3.Connection, Depends(get_db)], 
         category_id: int
         ):
     current_user = request.state.user
@@ -85,10 +97,10 @@ async def edit(
         return Response(status_code=401, content="not authenticated")
     
     try:
-        category_row = conn.execute(
+        category_row = await db_executor.fetchone(
             "SELECT * FROM category WHERE category_id = :category_id;", 
             {"category_id": category_id}
-            ).fetchone()
+            )
     except Exception as e:
         logger.error(f"DB error getting category {category_id}: {e}", exc_info=True)
     
@@ -103,7 +115,6 @@ async def edit(
 async def update(
         request: Request,
         current_user: Annotated[any, Depends(is_user)],
-        conn: Annotated[sqlite3.Connection, Depends(get_db)], 
         category_id: int
         ):
     if not current_user:
@@ -127,7 +138,7 @@ async def update(
         return Response(status_code=422, content="invalid is daily")
 
     try:
-        conn.execute(
+        await db_executor.execute(
             "UPDATE category SET name = :name, is_daily = :is_daily WHERE category_id = :category_id;", 
             {
                 "name": name,
@@ -135,16 +146,15 @@ async def update(
                 "category_id": category_id
             }
             )
-        conn.commit()
     except Exception as e:
         logger.error(f"DB error updating category {category_id}: {e}", exc_info=True)
         return Response(status_code=500, content="something went wrong on our end")
 
     try:
-        category_row = conn.execute(
+        category_row = await db_executor.fetchone(
             "SELECT * FROM category WHERE category_id = :category_id;", 
             {"category_id": category_id}
-            ).fetchone()
+            )
     except Exception as e:
         logger.error(f"DB error getting category {category_id}: {e}", exc_info=True)
     
@@ -161,7 +171,6 @@ async def update(
 async def delete(
         request: Request,
         current_user: Annotated[any, Depends(is_user)],
-        conn: Annotated[sqlite3.Connection, Depends(get_db)], 
         category_id: int
         ):
     accept_header = request.headers.get("accept", "")
@@ -170,8 +179,7 @@ async def delete(
         return Response(status_code=401, content="not authenticated")
 
     try:
-        conn.execute("DELETE FROM category WHERE category_id = :category_id;", {"category_id": category_id})
-        conn.commit()
+        await db_executor.execute("DELETE FROM category WHERE category_id = :category_id;", {"category_id": category_id})
     except Exception as e:
         logger.error(f"DB error deleting category: {e}", exc_info=True)
         return Response(status_code=500, content="something went wrong")
@@ -1,16 +1,90 @@
-from datetime import date, datetime, timezone
-import sqlite3
+from datetime import date
 from types import SimpleNamespace
 from zoneinfo import ZoneInfo
 
 from fastapi import Request
-from fastapi.templating import Jinja2Templates
 
-from src.config import get_db
+from src import analytics, purchase_import, utils
+from src.executor import db_executor
 from src.models.bucket import Bucket
 from src.respository import purchase_repository
+from src.templating import templates
 
-templates = Jinja2Templates(directory="templates")
+
+async def list(request: Request):
+    accept_header = request.headers.get("accept", "")
+    content_type = "application/vnd.hyperview+xml" if "hyperview" in accept_header else "text/xml"
+
+    if not request.state.user:
+        return templates.TemplateResponse(
+            request=request,
+            name="hv/purchases/_unauthorized.xml",
+            context={},
+            headers={"Content-Type": content_type}
+        )
+
+    page_cursor = request.query_params.get("cursor")
+    after = purchase_repository.decode_cursor(page_cursor) if page_cursor else None
+
+    purchase_rows, next_cursor = await purchase_repository.list_page_for_user_async(
+        user_id=request.state.user.user_id,
+        after=after
+        )
+
+    purchases = utils.localize_rows(purchase_rows)
+
+    rows_only = after or request.query_params.get("rows_only") == "true"
+
+    return templates.TemplateResponse(
+        request=request,
+        name="hv/purchases/_rows.xml" if rows_only else "hv/purchases/index.xml",
+        context={
+            "purchases": purchases,
+            "next_cursor": next_cursor
+            },
+        headers={"Content-Type": content_type}
+    )
+
+
+async def import_purchases(request: Request):
+    accept_header = request.headers.get("accept", "")
+    content_type = "application/vnd.hyperview+xml" if "hyperview" in accept_header else "text/xml"
+
+    if not request.state.user:
+        return templates.TemplateResponse(
+            request=request,
+            name="hv/purchases/_unauthorized.xml",
+            context={},
+            headers={"Content-Type": content_type}
+        )
+
+    file, fields = await purchase_import.read_upload(request)
+    if file is None:
+        result = purchase_import.ImportResult()
+        result.add_error(0, "You need to send a CSV file.")
+    else:
+        try:
+            result = await purchase_import.import_csv_async(
+                user_id=request.state.user.user_id,
+                file=file,
+                skip_invalid=fields.get("skip_invalid") in ("on", "true", "1")
+                )
+        except Exception:
+            return templates.TemplateResponse(
+                request=request,
+                name="hv/server-error.xml",
+                context={},
+                headers={"Content-Type": content_type}
+            )
+        finally:
+            file.close()
+
+    return templates.TemplateResponse(
+        request=request,
+        name="hv/purchases/import.xml",
+        context={"result": result},
+        headers={"Content-Type": content_type}
+    )
 
 
 async def show(request: Request, purchase_id: int):
@@ -18,9 +92,8 @@ async def show(request: Request, purchase_id: int):
     content_type = "application/vnd.hyperview+xml" if "hyperview" in accept_header else "text/xml"
 
     try:
-        with get_db() as conn:
-            purchase = purchase_repository.get(conn=conn, purchase_id=purchase_id)
-    except Exception as e:
+        purchase = await request.state.uow.get_async("purchase", purchase_id, purchase_repository.get)
+    except Exception:
         return templates.TemplateResponse(
             request=request,
             name="hv/server-error.xml",
@@ -36,9 +109,7 @@ async def show(request: Request, purchase_id: int):
             headers={"Content-Type": content_type}
         )
     
-    naive = datetime.strptime(purchase.purchased_at, "%Y-%m-%d %H:%M:%S")
-    utc_aware = naive.replace(tzinfo=timezone.utc)
-    purchase.purchased_at = utc_aware.astimezone(ZoneInfo(purchase.timezone))
+    purchase.purchased_at = purchase.purchased_at.astimezone(ZoneInfo(purchase.timezone))
 
     return templates.TemplateResponse(
         request=request,
@@ -52,13 +123,10 @@ async def edit(request: Request, purchase_id: int):
     accept_header = request.headers.get("accept", "")
     content_type = "application/vnd.hyperview+xml" if "hyperview" in accept_header else "text/xml"
 
-    with get_db() as conn:
-        purchase = purchase_repository.get(conn=conn, purchase_id=purchase_id)
+    purchase = await request.state.uow.get_async("purchase", purchase_id, purchase_repository.get)
 
     if purchase:
-        naive = datetime.strptime(purchase.purchased_at, "%Y-%m-%d %H:%M:%S")
-        utc_aware = naive.replace(tzinfo=timezone.utc)
-        purchase.purchased_at = utc_aware.astimezone(ZoneInfo(purchase.timezone))
+        purchase.purchased_at = purchase.purchased_at.astimezone(ZoneInfo(purchase.timezone))
 
     return templates.TemplateResponse(
         request=request,
@@ -87,13 +155,10 @@ async def update(request: Request, purchase_id: int):
     elif int(amount) <= 0:
         errors["amount"] = "The amoun needs to be more than 0."
 
-    with get_db() as conn:
-        purchase = purchase_repository.get(conn=conn, purchase_id=purchase_id)
+    purchase = await request.state.uow.get_async("purchase", purchase_id, purchase_repository.get)
 
     if purchase:
-        naive = datetime.strptime(purchase.purchased_at, "%Y-%m-%d %H:%M:%S")
-        utc_aware = naive.replace(tzinfo=timezone.utc)
-        purchase.purchased_at = utc_aware.astimezone(ZoneInfo(purchase.timezone))
+        purchase.purchased_at = purchase.purchased_at.astimezone(ZoneInfo(purchase.timezone))
 
     if errors:
         return templates.TemplateResponse(
@@ -106,11 +171,11 @@ async def update(request: Request, purchase_id: int):
             headers={"Content-Type": content_type}
         )
 
-    with get_db() as conn:
-        conn.execute(
-            "UPDATE purchase SET amount = ? WHERE purchase_id = ?;", 
-            (amount, purchase_id))
-        conn.commit()
+    await db_executor.execute(
+        "UPDATE purchase SET amount = ? WHERE purchase_id = ?;", 
+        (amount, purchase_id))
+    request.state.uow.evict("purchase", purchase_id)
+    analytics.invalidate(purchase.user_id)
 
     purchase.amount = amount
 
@@ -138,10 +203,9 @@ async def delete(request: Request, purchase_id: int):
             headers={"Content-Type": content_type}
         )
     
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.execute("PRAGMA foreign_keys=ON;")
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM purchase WHERE purchase_id = ?;", (purchase_id, ))
+    await db_executor.execute("DELETE FROM purchase WHERE purchase_id = ?;", (purchase_id, ))
+    request.state.uow.evict("purchase", purchase_id)
+    analytics.invalidate(request.state.user.user_id)
 
     return templates.TemplateResponse(
         request=request,
@@ -1,34 +1,26 @@
 from datetime import datetime, timedelta, timezone
-import sqlite3
 from zoneinfo import ZoneInfo
 from fastapi import Request
-from fastapi.templating import Jinja2Templates
-
-from src.models.bucket_month_top_up import BucketMonthTopUp
-
-templates = Jinja2Templates(directory="templates")
 
+from src.executor import db_executor
+from src.models.bucket_month_top_up import top_up_factory
+from src.templating import templates
 
 
 async def edit(request: Request, top_up_id: int):
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("""
-                        SELECT 
-                            btu.top_up_id, 
-                            btu.month_start, 
-                            btu.start_amount, 
-                            btu.end_amount,
-                            b.name as bucket_name,
-                            b.bucket_id 
-                        FROM bucket_month_top_up as btu
-                        JOIN bucket as b
-                        USING (bucket_id)
-                        WHERE top_up_id = ?;
-                       """, (top_up_id, ))
-        top_up = cursor.fetchone()
+    top_up = await db_executor.fetchone("""
+                    SELECT 
+                        btu.top_up_id, 
+                        btu.month_start, 
+                        btu.start_amount, 
+                        btu.end_amount,
+                        b.name as bucket_name,
+                        b.bucket_id 
+                    FROM bucket_month_top_up as btu
+                    JOIN bucket as b
+                    USING (bucket_id)
+                    WHERE top_up_id = ?;
+                   """, (top_up_id, ), row_factory=top_up_factory)
 
     if not top_up:
         return templates.TemplateResponse(
@@ -36,7 +28,6 @@ async def edit(request: Request, top_up_id: int):
             name="hv/404.xml",
             context={}
         )
-    top_up = BucketMonthTopUp(**top_up)
 
     return templates.TemplateResponse(
         request=request,
@@ -48,24 +39,19 @@ async def edit(request: Request, top_up_id: int):
 
 async def update(request: Request, top_up_id: int):
     
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("""
-                        SELECT 
-                            btu.top_up_id, 
-                            btu.month_start, 
-                            btu.start_amount, 
-                            btu.end_amount,
-                            b.name as bucket_name,
-                            b.bucket_id
-                        FROM bucket_month_top_up as btu
-                        JOIN bucket as b
-                        USING (bucket_id)
-                        WHERE top_up_id = ?;
-                       """, (top_up_id, ))
-        top_up = cursor.fetchone()
+    top_up = await db_executor.fetchone("""
+                    SELECT 
+                        btu.top_up_id, 
+                        btu.month_start, 
+                        btu.start_amount, 
+                        btu.end_amount,
+                        b.name as bucket_name,
+                        b.bucket_id
+                    FROM bucket_month_top_up as btu
+                    JOIN bucket as b
+                    USING (bucket_id)
+                    WHERE top_up_id = ?;
+                   """, (top_up_id, ), row_factory=top_up_factory)
 
     if not top_up:
         return templates.TemplateResponse(
@@ -110,13 +96,8 @@ async def update(request: Request, top_up_id: int):
         )
     
 
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("UPDATE bucket_month_top_up SET start_amount = ?, end_amount = ? WHERE top_up_id = ?;", (start_amount, end_amount, top_up_id))
+    await db_executor.execute("UPDATE bucket_month_top_up SET start_amount = ?, end_amount = ? WHERE top_up_id = ?;", (start_amount, end_amount, top_up_id))
 
-    top_up = BucketMonthTopUp(**top_up)
     top_up.start_amount = start_amount
     top_up.end_amount = end_amount
 
@@ -1,98 +1,84 @@
-from calendar import monthrange
-from datetime import date, datetime, timedelta, timezone
-import sqlite3
+from datetime import date, datetime, timezone
 from types import SimpleNamespace
 from zoneinfo import ZoneInfo
 
 from fastapi import Request, Response
-from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import JSONResponse, RedirectResponse
 
-from src import utils
-from src.models.bucket import Bucket
+from src import analytics, utils
+from src.executor import db_executor
+from src.models.purchase import purchase_factory
 from src.models.user import User
 from src.respository import purchase_repository
-
-templates = Jinja2Templates(directory="templates")
+from src.respository import stats as stats_repository
+from src.respository.timestamps import to_epoch
+from src.templating import stream_template, templates
+from src.write_queue import write_queue
 
 
 async def today_old(request: Request):
     if not request.state.user:
         return RedirectResponse(url="/login", status_code=303)
     
-    utc_date_today = datetime.now(timezone.utc)
-
-    local_date_today = utc_date_today.astimezone(ZoneInfo("Asia/Taipei"))
-
-    # month_start = local_date_today.replace(month=12, day=1).date()
-    month_start = local_date_today.replace(day=1).date()
-
-    local_start_of_day = local_date_today.replace(hour=0, minute=0, second=0)
-    utc_start_of_day =  local_start_of_day.astimezone(timezone.utc)
+    local_date_today = utils.get_local_today()
+    today = utils.boundaries.today()
+    this_month = utils.boundaries.this_month()
 
-    local_start_of_tomorrow = local_start_of_day + timedelta(days=1)
-    utc_start_of_tomorrow =  local_start_of_tomorrow.astimezone(timezone.utc)
+    month_start = this_month.first_day
+    utc_start_of_day = today.utc_start
+    utc_start_of_tomorrow = today.utc_end
     
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.row_factory = sqlite3.Row
-
-        cursor = conn.cursor()
-
-        cursor.execute("""
-                       SELECT b.bucket_id,
-                            b.name,
-                            b.is_daily,
-                            b.user_id,
-                            btu.month_start,
-                            btu.start_amount
-                        FROM bucket b
-                        JOIN bucket_month_top_up btu ON b.bucket_id = btu.bucket_id
-                        WHERE btu.month_start = ? 
-                        AND b.is_daily = 1 
-                        AND user_id is ?""", (month_start, request.state.user.user_id))
-       
-        row = cursor.fetchone()
-
-        if not row:
-            return templates.TemplateResponse(
-                request=request,
-                name="today.html",
-                context={
-                    "today_date": local_date_today,
-                    "purchases": None,
-                    "total_spent": None,
-                    "daily_spending_bucket": None
-                }
-            )
-        
-        daily_spending_bucket = SimpleNamespace(**row)
-        
-        cursor.execute("""SELECT purchase.purchase_id,
-                            purchase.amount, purchase.currency,
-                            purchase.purchased_at, purchase.timezone,
-                            purchase.user_id,
-                            purchase.bucket_id as bucket_id,
-                            bucket.name as bucket_name 
-                       FROM purchase
-                       JOIN bucket USING (bucket_id)
-                       WHERE purchase.user_id = ?
-                       AND bucket.is_daily = ?
-                       AND purchased_at >= ? AND purchased_at < ?
-                       ORDER BY purchased_at DESC;""", (request.state.user.user_id, 1, utc_start_of_day, utc_start_of_tomorrow))
-        
-        purchases = [SimpleNamespace(**row) for row in cursor.fetchall()]
+    row = await db_executor.fetchone("""
+                   SELECT b.bucket_id,
+                        b.name,
+                        b.is_daily,
+                        b.user_id,
+                        btu.month_start,
+                        btu.start_amount
+                    FROM bucket b
+                    JOIN bucket_month_top_up btu ON b.bucket_id = btu.bucket_id
+                    WHERE btu.month_start = ? 
+                    AND b.is_daily = 1 
+                    AND user_id is ?""", (month_start, request.state.user.user_id))
+
+    if not row:
+        return templates.TemplateResponse(
+            request=request,
+            name="today.html",
+            context={
+                "today_date": local_date_today,
+                "purchases": None,
+                "total_spent": None,
+                "daily_spending_bucket": None
+            }
+        )
+    
+    daily_spending_bucket = SimpleNamespace(**row)
+    
+    purchases = await db_executor.fetchall("""SELECT purchase.purchase_id,
+                        purchase.amount, purchase.currency,
+                        purchase.purchased_at, purchase.timezone,
+                        purchase.user_id,
+                        purchase.bucket_id as bucket_id,
+                        bucket.name as bucket_name 
+                   FROM purchase
+                   JOIN bucket USING (bucket_id)
+                   WHERE purchase.user_id = ?
+                   AND bucket.is_daily = ?
+                   AND purchased_at >= ? AND purchased_at < ?
+                   ORDER BY purchased_at DESC;""",
+                   (request.state.user.user_id, 1, to_epoch(utc_start_of_day), to_epoch(utc_start_of_tomorrow)),
+                   row_factory=purchase_factory)
 
     if daily_spending_bucket:
         daily_spending_bucket.month = datetime.strptime(daily_spending_bucket.month_start, "%Y-%m-%d")
-        daily_spending_bucket.daily_amount = daily_spending_bucket.start_amount / monthrange(month_start.year, month_start.month)[1]   
+        daily_spending_bucket.daily_amount = daily_spending_bucket.start_amount / this_month.days
 
 
+    utils.localize_rows(purchases)
+
     total_spent = 0
     for purchase in purchases:
-        naive = datetime.strptime(purchase.purchased_at, "%Y-%m-%d %H:%M:%S")
-        utc_aware = naive.replace(tzinfo=timezone.utc)
-        purchase.purchased_at = utc_aware.astimezone(ZoneInfo(purchase.timezone))
         total_spent += purchase.amount
 
     return templates.TemplateResponse(
@@ -117,26 +103,23 @@ async def today(request: Request):
 
     local_today = utils.get_local_today()
     default_date, default_time = utils.get_form_default_date_time(local_today=local_today)
-    utc_today_start, utc_today_end = utils.get_today_utc_range(local_today)
+    today = utils.boundaries.today()
 
-    purchase_rows = purchase_repository.list_for_period(
+    purchase_rows = purchase_repository.iter_for_period(
         user_id=current_user.user_id, 
-        period_start=utc_today_start,
-        period_end=utc_today_end
+        period_start=today.utc_start,
+        period_end=today.utc_end
         )
-        
-    purchases = [dict(row) for row in purchase_rows]
-    for purchase in purchases:
-        purchase["purchased_at"] = datetime.strptime(purchase["purchased_at"], "%Y-%m-%d %H:%M:%S")
 
-    return templates.TemplateResponse(
+    return stream_template(
+        templates,
         request=request,
         name="today.html",
         context={
             "today_date": local_today,
             "default_date": default_date,
             "default_time": default_time,
-            "purchases": purchases,
+            "purchases": purchase_rows,
             "total_spent": None,
             "daily_spending_bucket": None
             }
@@ -192,7 +175,7 @@ async def store(request: Request):
         print(f"error formatting times: {e}", exc_info=True)
 
     try:
-        purchase_repository.store(
+        await purchase_repository.store_async(
             amount=form_amount,
             currency="TWD",
             purchased_at=utc_string,
@@ -209,155 +192,50 @@ async def store(request: Request):
 async def stats(request: Request):
     if not request.state.user:
         return RedirectResponse(url="/login", status_code=303)
-    
-    month_start = date.today().replace(day=1)
-    
-    query_params = request.query_params
-    start_date = None
-    end_date = None
-    if query_params:
-        start_date = query_params.get("start_date")
-        end_date = query_params.get("end_date")
-        
-    if not start_date and not end_date:
-        utc_date_today = datetime.now(timezone.utc)
-        utc_start_of_month = utc_date_today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-        utc_end_of_month = utc_date_today.replace(day=monthrange(utc_start_of_month.year, utc_start_of_month.month)[1], hour=23, minute=59, second=59, microsecond=99999)
-
-        utc_start_of_next_month = utc_start_of_month.replace(day=monthrange(utc_start_of_month.year, utc_start_of_month.month)[1], hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-
-        bucket = Bucket.get_user_daily_bucket(user_id=request.state.user.user_id)
-        
-        if not bucket:
-            return templates.TemplateResponse(
-                request=request,
-                name="stats.html",
-                context={
-                    "bucket": None,
-                    "purchases": [],
-                    "amount_remaining": None,
-                    "amount_in_time_period": None,
-                    "total_spent_in_period": None,
-                    "start_value": utc_start_of_month.strftime("%Y-%m-%d"),
-                    "end_value": utc_end_of_month.strftime("%Y-%m-%d"),
-                }
-            )
-            
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-
-            cursor = conn.cursor()
 
-            cursor.execute("""SELECT purchase.purchase_id,
-                            purchase.amount, purchase.currency,
-                            purchase.purchased_at, purchase.timezone,
-                            purchase.user_id,
-                            purchase.bucket_id as bucket_id,
-                            bucket.name as bucket_name
-                        FROM purchase
-                        JOIN bucket USING (bucket_id)
-                        WHERE purchase.user_id = ?
-                        AND bucket.name = ?
-                        AND purchased_at >= ? AND purchased_at < ?
-                        ORDER BY purchased_at DESC;""",
-                        (request.state.user.user_id, bucket.name, utc_start_of_month, utc_start_of_next_month))
-            
-            rows = cursor.fetchall()
+    # the dates are the user's local days and the end date is inclusive, default is this month
+    this_month = utils.boundaries.this_month()
+    try:
+        first_day = date.fromisoformat(request.query_params.get("start_date") or this_month.first_day.isoformat())
+        last_day = date.fromisoformat(request.query_params.get("end_date") or this_month.last_day.isoformat())
+    except ValueError:
+        first_day, last_day = this_month.first_day, this_month.last_day
 
-        purchases = [SimpleNamespace(**row) for row in rows]
+    if last_day < first_day:
+        first_day, last_day = last_day, first_day
 
-        total_spent_in_period = 0
-        for purchase in purchases:
-            total_spent_in_period += purchase.amount
+    period = utils.boundaries.span(utils.LOCAL_TIMEZONE, first_day, last_day)
 
-        return templates.TemplateResponse(
-            request=request,
-            name="stats.html",
-            context={
-                "bucket": bucket,
-                "purchases": purchases,
-                "amount_remaining": None,
-                "amount_in_time_period": None,
-                "total_spent_in_period": total_spent_in_period,
-                "start_value": utc_start_of_month.strftime("%Y-%m-%d"),
-                "end_value": utc_end_of_month.strftime("%Y-%m-%d"),
-            }
+    series = await stats_repository.get_spending_stats_async(
+        user_id=request.state.user.user_id,
+        first_day=period.first_day,
+        last_day=period.last_day
         )
-
-    time_period_start = datetime.strptime(start_date, "%Y-%m-%d")
-    time_period_end = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
-
-    # Convert strings to datetime objects
-    number_of_days = None
-    if start_date and end_date:
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        # Calculate the difference and get the number of days
-        number_of_days = (end - start).days + 1
-
-    days_in_period = 100
-    if number_of_days:
-        days_in_period = number_of_days
-
-    bucket = Bucket.get_user_daily_bucket(user_id=request.state.user.user_id)
-
-    if not bucket:
-        return templates.TemplateResponse(
-            request=request,
-            name="stats.html",
-            context={
-                "bucket": None,
-                "purchases": [],
-                "amount_remaining": None,
-                "amount_in_time_period": None,
-                "total_spent_in_period": None,
-                "start_value": time_period_start.strftime("%Y-%m-%d"),
-                "end_value": time_period_end.strftime("%Y-%m-%d"),
-            }
+    series["start_date"] = period.first_day.isoformat()
+    series["end_date"] = period.last_day.isoformat()
+    series["days"] = period.days
+    series["charts"] = await analytics.summarize_async(
+        user_id=request.state.user.user_id,
+        first_day=period.first_day,
+        last_day=period.last_day,
+        data_version=request.state.data_version
         )
-    
-
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.row_factory = sqlite3.Row
 
-        cursor = conn.cursor()
-        cursor.execute("""SELECT purchase.purchase_id,
-                        purchase.amount, purchase.currency,
-                        purchase.purchased_at, purchase.timezone,
-                        purchase.user_id,
-                        purchase.bucket_id as bucket_id,
-                        bucket.name as bucket_name
-                    FROM purchase
-                    JOIN bucket USING (bucket_id)
-                    WHERE purchase.user_id = ?
-                    AND bucket.name = ?
-                    AND purchased_at >= ? AND purchased_at <= ?
-                    ORDER BY purchased_at DESC;""",
-                    (request.state.user.user_id, bucket.name, time_period_start, time_period_end))
-        
-        rows = cursor.fetchall()
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse(content=series)
 
-    purchases = [SimpleNamespace(**row) for row in rows]
-    
-    total_spent_in_period = 0
-    for purchase in purchases:
-        total_spent_in_period += purchase.amount
-    
     return templates.TemplateResponse(
         request=request,
         name="stats.html",
-        context={
-            "bucket": bucket,
-            "purchases": purchases,
-            "amount_in_time_period": None,
-            "total_spent_in_period": total_spent_in_period,
-            "start_value": time_period_start.strftime("%Y-%m-%d"),
-            "end_value": time_period_end.strftime("%Y-%m-%d"),
-        }
+        context=series
     )
 
 async def delete_toast():
     return Response(status_code=200)
+
+async def db_metrics(request: Request):
+    # internals of the database threads, so only for signed in users
+    if not request.state.user:
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+
+    return JSONResponse(content={**db_executor.metrics(), "writes": write_queue.metrics()})
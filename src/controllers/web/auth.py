@@ -1,14 +1,13 @@
-import sqlite3
 import time
 import uuid
 
 from fastapi import Request
 from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
 
-from src import cryptography
-
-templates = Jinja2Templates(directory="templates")
+from src.cryptography import password_service
+from src.respository.session import delete_session_async, store_session_async
+from src.respository.user import get_user_with_password_async, store_user_async
+from src.session_cache import session_cache
 
 
 async def register(request: Request):
@@ -25,27 +24,19 @@ async def register(request: Request):
     if not password:
         return "no password"
     
-    with sqlite3.connect("db.sqlite3") as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM user WHERE email = ?;", (email, ))
-        db_user = cursor.fetchone()
+    db_user = await get_user_with_password_async(email=email)
 
     if db_user:
         return "user exists"
 
     if not db_user:
-        hashed_password = cryptography.get_password_hash(password)
-        with sqlite3.connect("db.sqlite3") as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO user (email, hashed_password) VALUES (?, ?)", (email, hashed_password))
-            user_id = cursor.lastrowid
+        hashed_password = await password_service.hash(password)
+        user_id = await store_user_async(email=email, hashed_password=hashed_password)
     
     token = str(uuid.uuid4())
     expires_at = int(time.time()) + (60 * 60 * 24 * 3)
 
-    with sqlite3.connect("db.sqlite3") as conn:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO session (token, user_id, expires_at) VALUES (?, ?, ?);", (token, user_id, expires_at))
+    await store_session_async(token=token, user_id=user_id, expires_at=expires_at)
 
     response = RedirectResponse(url="/today", status_code=303)
     response.set_cookie(key="session-id", value=token)
@@ -67,26 +58,21 @@ async def session(request: Request):
     if not password:
         return "no password"
     
-    with sqlite3.connect("db.sqlite3") as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM user WHERE email = ?;", (email, ))
-        db_user = cursor.fetchone()
+    db_user = await get_user_with_password_async(email=email)
 
     if not db_user:
         return "user does not exist"
     
-    if not cryptography.verify_password(
+    if not await password_service.verify(
             plain_password=password,
-            hashed_password=db_user[2]
+            hashed_password=db_user["hashed_password"]
         ):
             return "wrong password"
     
     token = str(uuid.uuid4())
     expires_at = int(time.time()) + (60 * 60 * 24 * 3)
 
-    with sqlite3.connect("db.sqlite3") as conn:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO session (token, user_id, expires_at) VALUES (?, ?, ?);", (token, db_user[0], expires_at))
+    await store_session_async(token=token, user_id=db_user["user_id"], expires_at=expires_at)
 
     response = RedirectResponse(url="/today", status_code=303)
     response.set_cookie(key="session-id", value=token)
@@ -98,9 +84,8 @@ async def logout(request: Request):
     if not request.state.user:
         return RedirectResponse(url="/signin", status_code=303)
         
-    with sqlite3.connect("db.sqlite3") as conn:
-        cursor = conn.cursor()        
-        cursor.execute("DELETE FROM session where session_id = ?;", (request.state.user.session_id,))
+    await delete_session_async(session_id=request.state.user.session_id)
+    session_cache.invalidate(request.cookies.get("session-id"))
 
     response = RedirectResponse(url="/login", status_code=303)
     response.delete_cookie("session-id")
@@ -1,12 +1,10 @@
-from calendar import monthrange
-from datetime import date
 import sqlite3
 
 from fastapi import Request, Response
 from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
 
-templates = Jinja2Templates(directory="templates")
+from src import utils
+from src.executor import db_executor
 
 
 async def create(request: Request):
@@ -33,50 +31,52 @@ async def create(request: Request):
     
     amount = int(amount)
     
-    month_start = date.today().replace(day=1)
+    this_month = utils.boundaries.this_month()
+    month_start = this_month.first_day
 
-    with sqlite3.connect("db.sqlite3") as conn:
-        cursor = conn.cursor()
-        try:
-            if is_daily:
-                number_of_days = monthrange(month_start.year, month_start.month)[1]              
-                monthly_amount = amount * number_of_days
-                cursor.execute("INSERT INTO bucket (user_id, name, amount, month_start, is_daily) VALUES (?, ?, ?, ?, ?);", (request.state.user.user_id, bucket_name, monthly_amount, month_start, 1))
-            else:
-                cursor.execute("INSERT INTO bucket (user_id, name, amount, month_start) VALUES (?, ?, ?, ?);", (request.state.user.user_id, bucket_name, amount, month_start))
-        except sqlite3.IntegrityError as e:
-            message = str(e)
-            if "UNIQUE constraint failed" in message:
-                return f"You already have that bucket for this month."
-            else:
-                return f"Something went wrong storing that bucket."
-        except Exception as e:
-            print(e)
-            return f"Something went wrong on our server."
+    try:
+        if is_daily:
+            number_of_days = this_month.days
+            monthly_amount = amount * number_of_days
+            await db_executor.execute("INSERT INTO bucket (user_id, name, amount, month_start, is_daily) VALUES (?, ?, ?, ?, ?);", (request.state.user.user_id, bucket_name, monthly_amount, month_start, 1))
+        else:
+            await db_executor.execute("INSERT INTO bucket (user_id, name, amount, month_start) VALUES (?, ?, ?, ?);", (request.state.user.user_id, bucket_name, amount, month_start))
+    except sqlite3.IntegrityError as e:
+        message = str(e)
+        if "UNIQUE constraint failed" in message:
+            return f"You already have that bucket for this month."
+        else:
+            return f"Something went wrong storing that bucket."
+    except Exception as e:
+        print(e)
+        return f"Something went wrong on our server."
     
     return RedirectResponse(url="/me", status_code=303)
 
 
-def delete(request: Request, bucket_id: int):
-    if not request.state.user:
-        return RedirectResponse(url="/login", status_code=303)
-    
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.row_factory = sqlite3.Row
+def _delete_owned(conn: sqlite3.Connection, bucket_id: int, user_id: int) -> str:
+    cursor = conn.cursor()
+    cursor.execute("SELECT bucket_id, user_id FROM bucket WHERE bucket_id = ?;", (bucket_id,))
 
-        cursor = conn.cursor()
-        cursor.execute("SELECT bucket_id, user_id FROM bucket WHERE bucket_id = ?;", (bucket_id,))
+    bucket = cursor.fetchone()
+    if not bucket:
+        return "There is no bucket"
+
+    if bucket["user_id"] != user_id:
+        return "You are not the right user"
+    
+    cursor.execute("DELETE FROM bucket WHERE bucket_id = ?;", (bucket_id,))
+    return ""
 
-        bucket = cursor.fetchone()
-        if not bucket:
-            return "There is no bucket"
 
-        if bucket["user_id"] != request.state.user.user_id:
-            return "You are not the right user"
-        
-        cursor.execute("DELETE FROM bucket WHERE bucket_id = ?;", (bucket_id,))
+async def delete(request: Request, bucket_id: int):
+    if not request.state.user:
+        return RedirectResponse(url="/login", status_code=303)
+    
+    # the ownership check and the delete are one command on the write queue
+    error = await db_executor.write(_delete_owned, bucket_id=bucket_id, user_id=request.state.user.user_id)
+    if error:
+        return error
     
     response = Response(status_code=204, headers={"hx-refresh": "true"})
     return response
-
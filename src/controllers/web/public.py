@@ -1,8 +1,7 @@
 from fastapi import Request
 from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
 
-templates = Jinja2Templates(directory="templates")
+from src.templating import templates
 
 
 def home(request: Request):
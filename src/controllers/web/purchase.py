@@ -1,21 +1,17 @@
 from calendar import monthrange
 from datetime import date, datetime, timezone
-import sqlite3
-from types import SimpleNamespace
 from zoneinfo import ZoneInfo
 
 from fastapi import Request, Response
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 
-from src import utils
-from src.config import get_db
-from src.models.bucket import Bucket
+from src import analytics, purchase_export, purchase_import, utils
+from src.executor import db_executor
+from src.models.bucket import Bucket, bucket_factory
 from src.models.purchase import Purchase
 from src.models.user import User
 from src.respository import purchase_repository
-
-templates = Jinja2Templates(directory="templates")
+from src.templating import stream_template, templates
 
 
 async def list(request: Request):
@@ -26,24 +22,29 @@ async def list(request: Request):
         user_id=request.state.user.user_id,
         email=request.state.user.email
     )    
+
+    page_cursor = request.query_params.get("cursor")
+    after = purchase_repository.decode_cursor(page_cursor) if page_cursor else None
+    template_name = "purchases/_rows.html" if after else "purchases/index.html"
+
     try:
-        purchase_rows = purchase_repository.list_for_user(user_id=current_user.user_id)
+        purchase_rows, next_cursor = await purchase_repository.list_page_for_user_async(
+            user_id=current_user.user_id,
+            after=after
+            )
     except Exception as e:
         print("DB error getting purchases for user", exc_info=True)
         return templates.TemplateResponse(
             request=request,
-            name="purchases/index.html",
-            context={"purchases": []}
+            name=template_name,
+            context={"purchases": [], "next_cursor": None}
         )
         
-    purchases = [dict(row) for row in purchase_rows]
-    for purchase in purchases:
-        purchase["purchased_at"] = datetime.strptime(purchase["purchased_at"], "%Y-%m-%d %H:%M:%S")
-
-    return templates.TemplateResponse(
+    return stream_template(
+        templates,
         request=request,
-        name="purchases/index.html",
-        context={"purchases": purchases}
+        name=template_name,
+        context={"purchases": purchase_rows, "next_cursor": next_cursor}
     )
 
 
@@ -129,13 +130,9 @@ async def create(request: Request):
 
         default_date = localized_datetime.date()
         default_time = localized_datetime.time().strftime("%H:%M:%S")
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-
-            cursor = conn.cursor()
-            cursor.execute("SELECT bucket_id, is_daily, name FROM bucket WHERE user_id = ?;", (current_user.user_id, ))
-            buckets = [SimpleNamespace(**row) for row in cursor.fetchall()]
+        buckets = await db_executor.fetchall(
+            "SELECT bucket_id, is_daily, name FROM bucket WHERE user_id = ?;", (current_user.user_id, ), row_factory=bucket_factory
+            )
             
       
 
@@ -158,7 +155,7 @@ async def create(request: Request):
     utc_naive = utc_time.replace(tzinfo=None)
     
     try:
-        purchase_repository.store(
+        await purchase_repository.store_async(
             amount=amount,
             currency=currency,
             purchased_at=utc_naive,
@@ -175,6 +172,92 @@ async def create(request: Request):
     return RedirectResponse(url="/purchases", status_code=303)
 
 
+async def import_form(request: Request):
+    if not request.state.user:
+        return RedirectResponse(url="/login", status_code=303)
+
+    return templates.TemplateResponse(
+        request=request,
+        name="purchases/import.html",
+        context={"result": None, "columns": purchase_import.REQUIRED_COLUMNS}
+    )
+
+
+async def import_purchases(request: Request):
+    if not request.state.user:
+        return RedirectResponse(url="/login", status_code=303)
+
+    file, fields = await purchase_import.read_upload(request)
+    if file is None:
+        return templates.TemplateResponse(
+            request=request,
+            name="purchases/import.html",
+            context={"result": None, "columns": purchase_import.REQUIRED_COLUMNS, "error": "You need to choose a CSV file."},
+            status_code=400
+        )
+
+    try:
+        result = await purchase_import.import_csv_async(
+            user_id=request.state.user.user_id,
+            file=file,
+            skip_invalid=fields.get("skip_invalid") in ("on", "true", "1")
+            )
+    except Exception as e:
+        print(f"something went wrong importing purchases: {e}")
+        return templates.TemplateResponse(
+            request=request,
+            name="purchases/import.html",
+            context={"result": None, "columns": purchase_import.REQUIRED_COLUMNS, "error": "Something went wrong on our server."},
+            status_code=500
+        )
+    finally:
+        file.close()
+
+    return templates.TemplateResponse(
+        request=request,
+        name="purchases/import.html",
+        context={"result": result, "columns": purchase_import.REQUIRED_COLUMNS},
+        status_code=200 if result.committed else 422
+    )
+
+
+async def export(request: Request):
+    if not request.state.user:
+        return RedirectResponse(url="/login", status_code=303)
+
+    export_format = request.query_params.get("format")
+    if not export_format:
+        export_format = "ndjson" if "application/x-ndjson" in request.headers.get("accept", "") else "csv"
+    if export_format not in purchase_export.FORMATS:
+        return PlainTextResponse(f"format needs to be one of {', '.join(purchase_export.FORMATS)}", status_code=400)
+
+    # local days, both ends inclusive, either one can be left out
+    try:
+        first_day = request.query_params.get("start_date")
+        first_day = date.fromisoformat(first_day) if first_day else None
+        last_day = request.query_params.get("end_date")
+        last_day = date.fromisoformat(last_day) if last_day else None
+        category_id = request.query_params.get("category")
+        category_id = int(category_id) if category_id else None
+    except ValueError:
+        return PlainTextResponse("start_date and end_date need to look like 2024-12-31 and category needs to be an id", status_code=400)
+
+    utc_start = utc_end = None
+    if first_day:
+        utc_start = int(utils.boundaries.day(utils.LOCAL_TIMEZONE, first_day).utc_start.timestamp())
+    if last_day:
+        utc_end = int(utils.boundaries.day(utils.LOCAL_TIMEZONE, last_day).utc_end.timestamp())
+
+    return purchase_export.export_response(
+        user_id=request.state.user.user_id,
+        export_format=export_format,
+        utc_start=utc_start,
+        utc_end=utc_end,
+        category_id=category_id,
+        filename=f"purchases-{utils.boundaries.today().first_day.isoformat()}"
+        )
+
+
 async def show(request: Request, purchase_id: int):
     if not request.state.user:
         return RedirectResponse(url="/login", status_code=303)
@@ -205,12 +288,9 @@ async def show(request: Request, purchase_id: int):
             status_code=403
         )
     
-    with get_db() as conn:
-        purchase = purchase_repository.get(conn=conn, purchase_id=purchase_id)
+    purchase = await request.state.uow.get_async("purchase", purchase_id, purchase_repository.get)
 
-    naive = datetime.strptime(purchase.purchased_at, "%Y-%m-%d %H:%M:%S")
-    utc_aware = naive.replace(tzinfo=timezone.utc)
-    purchase.purchased_at = utc_aware.astimezone(ZoneInfo(purchase.timezone))
+    purchase.purchased_at = purchase.purchased_at.astimezone(ZoneInfo(purchase.timezone))
 
     return templates.TemplateResponse(
         request=request,
@@ -250,18 +330,11 @@ async def edit(request: Request, purchase_id: int):
         )
 
     try:
-        with sqlite3.connect("db.sqlite3") as conn:
-
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-
-            purchase = purchase_repository.get(conn=conn, purchase_id=purchase_id)
+        purchase = await request.state.uow.get_async("purchase", purchase_id, purchase_repository.get)
     except Exception as e:
         print(f"DB error getting purchase {purchase_id}: {e}", exc_info=True)
     
-    naive = datetime.strptime(purchase.purchased_at, "%Y-%m-%d %H:%M:%S")
-    utc_aware = naive.replace(tzinfo=timezone.utc)
-    purchase.purchased_at = utc_aware.astimezone(ZoneInfo(purchase.timezone))
+    purchase.purchased_at = purchase.purchased_at.astimezone(ZoneInfo(purchase.timezone))
     
     return templates.TemplateResponse(
         request=request,
@@ -299,8 +372,7 @@ async def update(request: Request, purchase_id: int):
         return "You need to choose a timezone."
 
     try:
-        with get_db() as conn:
-            purchase = purchase_repository.get(conn=conn, purchase_id=purchase_id)
+        purchase = await request.state.uow.get_async("purchase", purchase_id, purchase_repository.get)
     except Exception as e:
         print(f"DB error getting purchase {purchase_id}: {e}")
         purchase = None
@@ -314,12 +386,13 @@ async def update(request: Request, purchase_id: int):
     utc_naive = utc_time.replace(tzinfo=None)
 
     try:
-        with get_db() as conn:
-            purchase_repository.update(
-                conn=conn, 
-                amount=amount, 
-                purchased_at=utc_naive, 
-                purchase_id=purchase_id)
+        await purchase_repository.update_async(
+            amount=amount, 
+            purchased_at=utc_naive, 
+            timezone=purchase.timezone,
+            purchase_id=purchase_id)
+        request.state.uow.evict("purchase", purchase_id)
+        analytics.invalidate(request.state.user.user_id)
 
         html = "<div class='toast success' hx-delete='/toast/delete' hx-trigger='load delay:1.5s' hx-swap='outerHTML swap:300ms'><p>Purchase info updated</p></div>"
         return HTMLResponse(status_code=200, content=html, headers={"hx-retarget": "body", "hx-reswap": "afterbegin"})
@@ -341,12 +414,9 @@ async def delete(request: Request, purchase_id: int):
         return HTMLResponse(status_code=200, content=html, headers={"hx-retarget": "body", "hx-reswap": "afterbegin"})
     
     try:
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM purchase WHERE purchase_id = ?;", (purchase_id, ))
+        await db_executor.execute("DELETE FROM purchase WHERE purchase_id = ?;", (purchase_id, ))
+        request.state.uow.evict("purchase", purchase_id)
+        analytics.invalidate(request.state.user.user_id)
         return Response(headers={"hx-redirect": "/purchases"})
     except Exception as e:
         html = "<div class='toast failure' hx-delete='/toast/delete' hx-trigger='load delay:1.5s' hx-swap='outerHTML swap:300ms'><p>Something went wrong deleting the purchase</p></div>"
@@ -1,15 +1,14 @@
-from calendar import monthrange
 from datetime import date, datetime, timedelta, timezone
-import sqlite3
 from types import SimpleNamespace
 from zoneinfo import ZoneInfo
 import logging
 
 from fastapi import Request, Response
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 
-templates = Jinja2Templates(directory="templates")
+from src import utils
+from src.executor import db_executor
+from src.respository import top_up as top_up_repository
 
 logger = logging.getLogger(__name__)
 
@@ -43,13 +42,7 @@ async def store(request: Request, bucket_id: int):
         return HTMLResponse(status_code=200, content=html)
 
     try:
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-
-            cursor = conn.cursor()
-            cursor.execute("SELECT bucket_id, is_daily FROM bucket WHERE bucket_id = ?;", (bucket_id, ))
-            bucket = cursor.fetchone()
+        bucket = await db_executor.fetchone("SELECT bucket_id, is_daily FROM bucket WHERE bucket_id = ?;", (bucket_id, ))
     except Exception as e:
         logger.error("Error retrieving bucket from db:", e)
         html = f"<p>Something went wrong with our server. Please try again.</p>"
@@ -60,24 +53,17 @@ async def store(request: Request, bucket_id: int):
         html = f"<p>We couldn't find a bucket for your top up. Please try again.</p>"
         return HTMLResponse(status_code=200, content=html)
     
-    year = int(month_start.split("-")[0])
-    month = int(month_start.split("-")[1])
-    _, num_days_in_month = monthrange(year, month)
+    num_days_in_month = utils.boundaries.month(utils.LOCAL_TIMEZONE, date.fromisoformat(month_start)).days
 
     if bucket["is_daily"]:
         start_amount = start_amount * num_days_in_month
 
     try:
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-
-            cursor = conn.cursor()
-            cursor.execute("""
-                            INSERT INTO bucket_month_top_up (
-                                bucket_id, month_start, start_amount
-                            ) VALUES (?, ?, ?);
-                           """, (bucket_id, month_start, start_amount))
+        await db_executor.execute("""
+                        INSERT INTO bucket_month_top_up (
+                            bucket_id, month_start, start_amount
+                        ) VALUES (?, ?, ?);
+                       """, (bucket_id, month_start, start_amount))
     except Exception as e:
         logger.error("error inserting top up", e)
         html = f"<p>Something went wrong adding your top up. No balance has been added, please try again.</p>"
@@ -88,22 +74,19 @@ async def store(request: Request, bucket_id: int):
 
 async def delete(request: Request, top_up_id: int):
     if not request.state.user:
-        logger.error("Unauthorized access to top_up.delete", top_up_id)
+        logger.error("Unauthorized access to top_up.delete %s", top_up_id)
         html = f"<p>You don't have permission to do that. Please check your log in. You may need to <a href='/logout'>Log out</a></p>"
         return HTMLResponse(status_code=200, content=html)
 
     if not request.state.top_up:
-        logger.error("Unauthorized access to top_up.delete", top_up_id)
+        logger.error("Unauthorized access to top_up.delete %s", top_up_id)
         html = f"<p>You don't have permission to do that. Please check your log in. You may need to <a href='/logout'>Log out</a></p>"
         return HTMLResponse(status_code=200, content=html)
     
-    with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-
-            cursor = conn.cursor()
-            cursor.execute("SELECT top_up_id FROM bucket_month_top_up WHERE top_up_id = ?;", (top_up_id, ))
-            top_up = cursor.fetchone()
+    # is_top_up_owner already loaded it into the unit of work
+    top_up = await request.state.uow.get_async(
+        "top_up", (top_up_id, request.state.user.user_id), top_up_repository.get_for_user
+        )
 
     if not top_up:
         logger.error("top up not found", top_up_id)
@@ -111,12 +94,8 @@ async def delete(request: Request, top_up_id: int):
         return HTMLResponse(status_code=200, content=html)
     
     try:
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM bucket_month_top_up WHERE top_up_id = ?;", (top_up_id, ))
+        await db_executor.execute("DELETE FROM bucket_month_top_up WHERE top_up_id = ?;", (top_up_id, ))
+        request.state.uow.evict("top_up", (top_up_id, request.state.user.user_id))
     except Exception as e:
         logger.error("unable to delete", e)
         html = f"<p>Something went wrong deleting your top up. Please try again.</p>"
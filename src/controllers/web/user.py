@@ -1,13 +1,12 @@
-from datetime import date, datetime, timezone
+from datetime import date
 import sqlite3
 from types import SimpleNamespace
-from zoneinfo import ZoneInfo
 
 from fastapi import Request
 from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
 
-templates = Jinja2Templates(directory="templates")
+from src import utils
+from src.templating import templates
 
 
 async def me(request: Request):
@@ -22,9 +21,7 @@ async def me(request: Request):
                 "link_text": "Log in"
             })
     
-    utc_date_today = datetime.now(timezone.utc)
-    local_date_today = utc_date_today.astimezone(ZoneInfo("Asia/Taipei"))
-    month_start = local_date_today.replace(day=1).date()
+    month_start = utils.boundaries.this_month().first_day
 
     # try:
     #     with sqlite3.connect("db.sqlite3") as conn:
@@ -1,8 +1,16 @@
 """ Functions to handle Authentication concerns including passwords, sessions, and current user """
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", str(PASSWORD_WORKERS * 4)))
+
 
 def get_password_hash(password):
     """returns hashed password"""
@@ -12,3 +20,52 @@ def get_password_hash(password):
 def verify_password(plain_password, hashed_password):
     """returns True if password is correct, False if not"""
     return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordService:
+    """
+    Runs bcrypt in a process pool so hashing never holds the event loop or the GIL.
+    At most max_pending calls may be running or waiting; anything beyond that
+    is rejected with a 503 so a login storm only slows down logins.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        # only ever touched from the event loop thread, so a plain counter is enough
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many sign in attempts right now. Please try again shortly.",
+                headers={"Retry-After": "1"}
+            )
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password):
+        return await self._submit(get_password_hash, password)
+
+    async def verify(self, plain_password, hashed_password):
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_service = PasswordService(max_workers=PASSWORD_WORKERS, max_pending=PASSWORD_QUEUE_SIZE)
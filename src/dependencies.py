@@ -1,12 +1,24 @@
-import sqlite3
+import hashlib
+import os
 import time
 import logging
 from types import SimpleNamespace
 
-from fastapi import Request
+from fastapi import Depends, HTTPException, Request
+
+from src import utils
+from src.respository import purchase_repository
+from src.respository import top_up as top_up_repository
+from src.respository.session import get_session_user
+from src.respository.user import get_data_version
+from src.session_cache import session_cache
+from src.unit_of_work import UnitOfWork, get_unit_of_work
 
 logger = logging.getLogger(__name__)
 
+# change it on deploy so template changes aren't answered with a stale 304
+ETAG_SALT = os.getenv("ETAG_SALT", "")
+
 def is_expired(expires_at):
         current_time = int(time.time())
 
@@ -16,94 +28,99 @@ def is_expired(expires_at):
         return False
     
 
-def is_user(request: Request):
+def is_user(request: Request, uow: UnitOfWork = Depends(get_unit_of_work)):
     """Checks if user is a guest"""
     session_token = request.cookies.get("session-id", None)
     if not session_token: 
         request.state.user = None
         return
-    
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM session WHERE token = ?;", (session_token,))
-        session = cursor.fetchone()
 
-    if not session:
-        request.state.user = None
-        return
-    
-    session = SimpleNamespace(**session)
+    cached_user = session_cache.get(session_token)
+    if cached_user:
+        request.state.user = cached_user
+        return cached_user
     
-    if is_expired(expires_at=session.expires_at):
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys=ON;")
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM session WHERE session_id = ?;", (session.session_id, ))
+    with uow.borrow() as conn:
+        row = get_session_user(conn=conn, token=session_token)
 
+    if not row:
         request.state.user = None
         return
     
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("""
-                        SELECT 
-                        user.user_id, user.email, session.session_id 
-                        FROM user 
-                        JOIN session 
-                        USING (user_id) 
-                        WHERE user_id = ?;
-                       """, (session.user_id,))
-        db_user = cursor.fetchone()
-
-    if not db_user:
+    # expired rows are cleaned up by the session reaper, never in the request path
+    if is_expired(expires_at=row["expires_at"]):
         request.state.user = None
         return
     
-    request.state.user = SimpleNamespace(**db_user)
+    current_user = SimpleNamespace(user_id=row["user_id"], email=row["email"], session_id=row["session_id"])
+    session_cache.set(session_token, current_user, expires_at=row["expires_at"])
+    request.state.user = current_user
     
-    return SimpleNamespace(**db_user)
+    return current_user
 
-def is_purchase_owner(request: Request, purchase_id: int):
-    request.state.purchase = None
+def make_etag(request: Request, data_version: int) -> str:
+    """
+    Strong ETag for what this user sees at this URL right now.
+    Pages show the local day and month, so the day is part of it too.
+    """
+    parts = [
+        ETAG_SALT,
+        str(request.state.user.user_id),
+        str(data_version),
+        utils.boundaries.today().first_day.isoformat(),
+        request.url.path,
+        request.url.query,
+        request.headers.get("accept", ""),
+        request.headers.get("hx-request", ""),
+    ]
+    digest = hashlib.blake2b("\n".join(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
 
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM purchase WHERE purchase_id = ?;", (purchase_id, ))
-        row = cursor.fetchone()
+def if_none_match(request: Request, uow: UnitOfWork = Depends(get_unit_of_work)):
+    """
+    Answers a matching If-None-Match with 304 before the route runs any queries.
+    Goes after is_user. The ETag header itself is added by ETagMiddleware, and
+    request.state.data_version is left for the fragment cache.
+    """
+    request.state.etag = None
+    request.state.data_version = None
 
-    if row:
-        request.state.purchase = SimpleNamespace(**row)
+    if not request.state.user:
+        return
+
+    with uow.borrow() as conn:
+        data_version = get_data_version(conn=conn, user_id=request.state.user.user_id)
+
+    if data_version is None:
+        return
+
+    request.state.data_version = data_version
+    etag = make_etag(request, data_version)
+    request.state.etag = etag
+
+    # If-None-Match uses the weak comparison
+    candidates = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in candidates or "*" in candidates:
+        raise HTTPException(status_code=304)
+
+def is_purchase_owner(request: Request, purchase_id: int, uow: UnitOfWork = Depends(get_unit_of_work)):
+    """Loads the whole purchase into the unit of work, so the handler doesn't fetch it again"""
+    request.state.purchase = uow.get("purchase", purchase_id, purchase_repository.get)
 
     return
     
 
-def is_top_up_owner(request: Request, top_up_id: int):
+def is_top_up_owner(request: Request, top_up_id: int, uow: UnitOfWork = Depends(get_unit_of_work)):
     request.state.top_up = None
 
     if not request.state.user:
         return
     
     try:
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("""
-                           SELECT btu.*
-                           FROM bucket_month_top_up btu
-                           JOIN bucket b USING(bucket_id)
-                           WHERE btu.top_up_id = ?
-                           AND b.user_id = ?;""",
-                           (top_up_id, request.state.user.user_id))
-            top_up = cursor.fetchone()
+        # keyed with the user, so a handler only ever gets a top-up this user owns
+        request.state.top_up = uow.get("top_up", (top_up_id, request.state.user.user_id), top_up_repository.get_for_user)
     except Exception as e:
-        logger.error(f"unable to find top up for user:", e)
+        logger.error("unable to find top up for user: %s", e)
         return
-
-    if top_up:
-        request.state.top_up = SimpleNamespace(**top_up)
     
     return
\ No newline at end of file
@@ -0,0 +1,116 @@
+""" Runs blocking sqlite work off the event loop on a dedicated thread pool """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import logging
+import os
+import threading
+
+from src.config import pool
+from src.write_queue import write_queue
+
+logger = logging.getLogger(__name__)
+
+# not tied to DB_READ_POOL_SIZE: readers are only held while a call runs, and some calls
+# (parsing an import, dedicated export readers) don't take one from the pool at all
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+DB_QUEUE_WARN_DEPTH = int(os.getenv("DB_QUEUE_WARN_DEPTH", str(DB_EXECUTOR_WORKERS * 4)))
+
+
+def _cursor(conn, row_factory=None):
+    cursor = conn.cursor()
+    if row_factory is not None:
+        cursor.row_factory = row_factory
+    return cursor
+
+
+class DatabaseExecutor:
+    """
+    Awaitable wrapper around the connection pool.
+    Work is queued on a fixed size thread pool and the queue depth is tracked
+    so it can be reported while the database is busy.
+    """
+
+    def __init__(self, max_workers: int, warn_depth: int):
+        self.max_workers = max_workers
+        self.warn_depth = warn_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._max_queued = 0
+
+    def _call(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Run any blocking callable on the database threads."""
+        with self._lock:
+            self._queued += 1
+            queued = self._queued
+            self._max_queued = max(self._max_queued, queued)
+
+        if queued > self.warn_depth:
+            logger.warning(f"database queue depth is {queued} (workers: {self.max_workers})")
+
+        loop = asyncio.get_running_loop()
+        # like asyncio.to_thread, so the request's unit of work follows the call onto the thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, context.run, self._call, fn, args, kwargs)
+
+    async def read(self, fn, *args, **kwargs):
+        """Run fn(conn, ...) with a pooled read-only connection."""
+        def call():
+            with pool.reader() as conn:
+                return fn(conn, *args, **kwargs)
+
+        return await self.run(call)
+
+    async def write(self, fn, *args, **kwargs):
+        """
+        Run fn(conn, ...) on the writer connection through the write queue.
+        It gets a savepoint of its own and may be committed together with other writes.
+        """
+        return await write_queue.submit(fn, *args, **kwargs)
+
+    async def fetchone(self, sql: str, params=(), row_factory=None):
+        """row_factory (e.g. a src.models.rows factory) replaces sqlite3.Row for this query only"""
+        return await self.read(lambda conn: _cursor(conn, row_factory).execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params=(), row_factory=None):
+        return await self.read(lambda conn: _cursor(conn, row_factory).execute(sql, params).fetchall())
+
+    async def execute(self, sql: str, params=()):
+        """Run a single write statement and return the cursor's lastrowid."""
+        return await self.write(lambda conn: conn.execute(sql, params).lastrowid)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "max_queued": self._max_queued,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+db_executor = DatabaseExecutor(max_workers=DB_EXECUTOR_WORKERS, warn_depth=DB_QUEUE_WARN_DEPTH)
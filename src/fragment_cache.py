@@ -0,0 +1,121 @@
+""" Rendered template fragments kept in memory per user and data version """
+import asyncio
+from collections import OrderedDict
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from fastapi.templating import Jinja2Templates
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_CACHE_BYTES = int(os.getenv("FRAGMENT_CACHE_BYTES", str(8 * 1024 * 1024)))
+# serve the previous version while one background task renders the new one
+FRAGMENT_CACHE_SERVE_STALE = os.getenv("FRAGMENT_CACHE_SERVE_STALE", "0") == "1"
+
+
+class FragmentCache:
+    """
+    LRU of (template, user_id, params) -> (data_version, rendered bytes), bounded by total bytes.
+    An entry is fresh while its data_version matches the user's current one. A stale entry is
+    either re-rendered in the request, or served as is while a single background task
+    re-renders it. Only used from the event loop, so there's no locking.
+    """
+
+    def __init__(self, max_bytes: int, serve_stale: bool = False):
+        self.max_bytes = max_bytes
+        self.serve_stale = serve_stale
+        self.size = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._refreshing = {}
+
+    async def render(
+            self,
+            templates: Jinja2Templates,
+            name: str,
+            user_id: int,
+            data_version: int,
+            build_context: Callable[[], Awaitable[dict]],
+            params: Optional[dict] = None,
+            serve_stale: Optional[bool] = None
+            ) -> bytes:
+        """
+        Rendered name for this user. build_context loads whatever the template needs and is
+        only awaited on a miss, so a hit never touches the database. params is everything
+        else the output depends on (the local day, query params ...).
+        """
+        key = (name, user_id, tuple(sorted((params or {}).items())))
+        serve_stale = self.serve_stale if serve_stale is None else serve_stale
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            version, content = entry
+            if version == data_version:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return content
+
+            if serve_stale and version < data_version:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._refreshing:
+                    task = asyncio.create_task(self._refresh(templates, key, data_version, build_context))
+                    self._refreshing[key] = task
+                return content
+
+        self.misses += 1
+        content = await self._render(templates, name, build_context)
+        self._store(key, data_version, content)
+        return content
+
+    async def _render(self, templates: Jinja2Templates, name: str, build_context) -> bytes:
+        context = await build_context()
+        return templates.get_template(name).render(context).encode("utf-8")
+
+    async def _refresh(self, templates: Jinja2Templates, key: tuple, data_version: int, build_context):
+        try:
+            content = await self._render(templates, key[0], build_context)
+            self._store(key, data_version, content)
+        except Exception as e:
+            logger.error(f"re-rendering {key[0]} failed: {e}", exc_info=True)
+            self._entries.pop(key, None)
+        finally:
+            self._refreshing.pop(key, None)
+
+    def _store(self, key: tuple, data_version: int, content: bytes):
+        if len(content) > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            # a slow render must not overwrite a newer one
+            if previous[0] > data_version:
+                self._entries[key] = previous
+                return
+            self.size -= len(previous[1])
+
+        self._entries[key] = (data_version, content)
+        self.size += len(content)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshing": len(self._refreshing),
+        }
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+fragment_cache = FragmentCache(max_bytes=FRAGMENT_CACHE_BYTES, serve_stale=FRAGMENT_CACHE_SERVE_STALE)
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends
 
 from src.controllers.hv import application, auth, category, purchase, top_up
-from src.dependencies import is_user
+from src.dependencies import if_none_match, is_user
 
 
 hv_router = APIRouter()
@@ -9,7 +9,7 @@ hv_router = APIRouter()
 # ('HTTP method', 'URI path', 'handler function', 'dependencies')
 routes = [
     ("GET",     "/hv/index",        application.index,  [Depends(is_user)]),
-    ("GET",     "/hv/today",        application.today,  [Depends(is_user)]),
+    ("GET",     "/hv/today",        application.today,  [Depends(is_user), Depends(if_none_match)]),
     ("POST",    "/hv/today",        application.store,  [Depends(is_user)]),
     ("GET",     "/hv/today/new",    application.new,    [Depends(is_user)]),
 
@@ -18,13 +18,15 @@ routes = [
     ("GET",     "/hv/logout",       auth.logout,  [Depends(is_user)]),
 
 
+    ("GET",     "/hv/purchases",                        purchase.list,      [Depends(is_user)]),
+    ("POST",    "/hv/purchases/import",                 purchase.import_purchases,  [Depends(is_user)]),
     ("GET",     "/hv/purchases/{purchase_id}",          purchase.show,      [Depends(is_user)]),
     ("GET",     "/hv/purchases/{purchase_id}/edit",     purchase.edit,      [Depends(is_user)]),
     ("POST",    "/hv/purchases/{purchase_id}/edit",     purchase.update,    [Depends(is_user)]),
     ("POST",    "/hv/purchases/{purchase_id}/delete",   purchase.delete,    [Depends(is_user)]),
 
 
-    ("GET",     "/hv/categories",                       category.list, [Depends(is_user)]),
+    ("GET",     "/hv/categories",                       category.list, [Depends(is_user), Depends(if_none_match)]),
     ("GET",     "/hv/categories/{category_id}",         category.show, [Depends(is_user)]),
     ("GET",     "/hv/categories/{category_id}/edit",    category.edit, []),
     ("POST",    "/hv/categories/{category_id}/edit",    category.update, []),
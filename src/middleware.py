@@ -0,0 +1,211 @@
+""" Pure ASGI middleware, kept out of BaseHTTPMiddleware so streamed responses stay streamed """
+import os
+from typing import Iterable, Optional
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ETagMiddleware:
+    """
+    Adds the ETag that the if_none_match dependency left on request.state
+    to 200 and 304 responses. Those responses are per user, so they also get
+    private, no-cache: browsers keep them but revalidate every time.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_etag(message: Message):
+            if message["type"] == "http.response.start" and message["status"] in (200, 304):
+                etag = scope.get("state", {}).get("etag")
+                if etag:
+                    headers = MutableHeaders(scope=message)
+                    headers["ETag"] = etag
+                    headers["Cache-Control"] = "private, no-cache"
+                    headers.add_vary_header("Cookie")
+                    headers.add_vary_header("Accept")
+                    headers.add_vary_header("HX-Request")
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+
+COMPRESSIBLE_TYPES = {"text/html", "text/xml", "application/vnd.hyperview+xml", "text/csv", "application/x-ndjson"}
+# below this many bytes the headers cost more than compression saves
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# compress streamed responses chunk by chunk instead of buffering them whole
+COMPRESSION_STREAMING = os.getenv("COMPRESSION_STREAMING", "1") == "1"
+
+
+def negotiate_encoding(accept_encoding: str, offered: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    br or gzip, whichever the client weights higher (br on a tie), or None.
+    offered narrows the choice, earlier ones win ties; it defaults to what this process can compress.
+    """
+    if offered is None:
+        offered = ("br", "gzip") if brotli is not None else ("gzip",)
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in offered:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """data plus a flush, so whatever the client has received so far can be decoded"""
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+def _weaken_etag(headers: MutableHeaders):
+    # compressed bytes are a different representation of the same thing
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+class CompressionMiddleware:
+    """
+    gzip/brotli for HTML, Hyperview XML and purchase exports.
+    Anything else, anything that already has a Content-Encoding (the precompressed
+    /assets files) and complete bodies under minimum_size go out untouched.
+    Streamed pages stay streamed unless streaming is off, in which case they're buffered
+    and compressed in one go, which is slightly smaller but delays the first byte.
+    Add it after ETagMiddleware so it wraps it and can weaken the ETags of what it compresses.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = COMPRESSION_MIN_SIZE,
+            gzip_level: int = COMPRESSION_GZIP_LEVEL,
+            brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+            streaming: bool = COMPRESSION_STREAMING,
+            media_types: Iterable[str] = COMPRESSIBLE_TYPES
+            ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.streaming = streaming
+        self.media_types = set(media_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+        compressor = None
+        passthrough = False
+        buffered = []
+
+        def compressed_start(body_length: Optional[int] = None) -> Message:
+            headers = MutableHeaders(scope=start)
+            headers["Content-Encoding"] = encoding
+            if body_length is None:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(body_length)
+            _weaken_etag(headers)
+            return start
+
+        async def send_compressed(message: Message):
+            nonlocal start, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                if encoding is not None and message["status"] == 304:
+                    # match the ETag of the compressed 200 it stands in for
+                    _weaken_etag(MutableHeaders(scope=message))
+                media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+                if media_type not in self.media_types:
+                    passthrough = True
+                    await send(message)
+                    return
+
+                MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                if encoding is None or "content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is not None:
+                # already streaming
+                chunk = compressor.compress(body) if more_body else compressor.finish(body)
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            if more_body and self.streaming:
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                await send(compressed_start())
+                await send({"type": "http.response.body", "body": compressor.compress(body), "more_body": True})
+                return
+
+            if more_body:
+                buffered.append(body)
+                return
+
+            body = b"".join(buffered) + body
+            if len(body) < self.minimum_size:
+                if buffered:
+                    MutableHeaders(scope=start)["Content-Length"] = str(len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+
+            compressed = _Compressor(encoding, self.gzip_level, self.brotli_quality).finish(body)
+            await send(compressed_start(len(compressed)))
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
@@ -3,8 +3,12 @@ from datetime import date, datetime
 import sqlite3
 from typing import List, Optional
 
+from src.config import pool
+from src.executor import db_executor
+from src.models.rows import model_factory
 
-@dataclass
+
+@dataclass(slots=True)
 class Bucket:
     # table attributes
     bucket_id: int
@@ -19,43 +23,57 @@ class Bucket:
     # application attributes
     top_up: Optional[int] = None
 
+    # the bucket table is category now, its id is still read as bucket_id
+    @staticmethod
+    def _columns(fields: List[str]) -> str:
+        return ", ".join("category_id AS bucket_id" if field == "bucket_id" else field for field in fields)
+
     @classmethod
     def list_for_month(cls, user_id: int, fields: List[str]):
         if not fields:
-            columns = "bucket_id, name, is_daily"
+            columns = "category_id AS bucket_id, name, is_daily"
         else:
-            columns = ", ".join(fields).rstrip(", ")
+            columns = cls._columns(fields)
         
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
-
+        with pool.reader() as conn:
             cursor = conn.cursor()
-            cursor.execute(f"SELECT {columns} FROM bucket WHERE user_id = ?;", (user_id, ))
+            cursor.row_factory = bucket_factory
+            cursor.execute(f"SELECT {columns} FROM category WHERE user_id = ?;", (user_id, ))
             
-            return [Bucket(**row) for row in cursor.fetchall()]
+            return cursor.fetchall()
 
 
     @classmethod
     def get_user_daily_bucket(cls, user_id: int, columns: List[str] = []) :
         if not columns:
-            columns = "*"
+            columns = "category_id AS bucket_id, name, is_daily, created_at, user_id"
         else:
-            columns = ", ".join(columns).rstrip(",")
-
-        with sqlite3.connect("db.sqlite3") as conn:
-            conn.execute("PRAGMA foreign_keys = ON;")
-            conn.row_factory = sqlite3.Row
+            columns = cls._columns(columns)
 
+        with pool.reader() as conn:
             cursor = conn.cursor()
-            cursor.execute(f"SELECT {columns} FROM bucket WHERE user_id = ? AND is_daily = 1;", (user_id, ))
-            row = cursor.fetchone()
-
-            return Bucket(**row) if row else None
+            cursor.row_factory = bucket_factory
+            cursor.execute(f"SELECT {columns} FROM category WHERE user_id = ? AND is_daily = 1;", (user_id, ))
+            return cursor.fetchone()
 
     @classmethod
     def get(cls, conn: sqlite3.Connection, bucket_id: int):
         cursor = conn.cursor()
-        cursor.execute("SELECT bucket_id, name FROM bucket WHERE bucket_id = ?;", (bucket_id, ))
-        row = cursor.fetchone()
-        return Bucket(**row) if row else None
\ No newline at end of file
+        cursor.row_factory = bucket_factory
+        cursor.execute("SELECT category_id AS bucket_id, name FROM category WHERE category_id = ?;", (bucket_id, ))
+        return cursor.fetchone()
+
+    @classmethod
+    async def list_for_month_async(cls, user_id: int, fields: List[str]):
+        return await db_executor.run(cls.list_for_month, user_id=user_id, fields=fields)
+
+    @classmethod
+    async def get_user_daily_bucket_async(cls, user_id: int, columns: List[str] = []):
+        return await db_executor.run(cls.get_user_daily_bucket, user_id=user_id, columns=columns)
+
+    @classmethod
+    async def get_async(cls, bucket_id: int):
+        return await db_executor.read(cls.get, bucket_id=bucket_id)
+
+
+bucket_factory = model_factory(Bucket)
@@ -3,8 +3,10 @@ from datetime import date, datetime
 import sqlite3
 from typing import List, Optional
 
+from src.models.rows import model_factory
 
-@dataclass
+
+@dataclass(slots=True)
 class BucketMonthTopUp:
     top_up_id: int
     month_start: Optional[str] = None
@@ -12,4 +14,7 @@ class BucketMonthTopUp:
     end_amount: Optional[int] = None
 
     bucket_id: Optional[int] = None
-    bucket_name: Optional[str] = None
\ No newline at end of file
+    bucket_name: Optional[str] = None
+
+
+top_up_factory = model_factory(BucketMonthTopUp)
@@ -1,22 +1,27 @@
 from dataclasses import dataclass
+from datetime import datetime
 import sqlite3
 from typing import Optional
 
-@dataclass
+from src.executor import db_executor
+from src.models.rows import model_factory
+from src.respository.timestamps import lazy_epoch
+
+@dataclass(slots=True)
 class Purchase:
     purchase_id: int
     amount: Optional[int] = None
     currency: Optional[str] = None
-    purchased_at: Optional[str] = None
+    purchased_at: Optional[datetime] = None
     timezone: Optional[str] = None
     user_id: Optional[int] = None
     bucket_id: Optional[int] = None
-    bucket_name: Optional[int] = None
+    bucket_name: Optional[str] = None
 
     @classmethod
     def get_user_purchases(cls, conn: sqlite3.Connection, user_id: int):
         cursor = conn.cursor()
-
+        cursor.row_factory = purchase_factory
         cursor.execute(
             """
             SELECT 
@@ -25,18 +30,19 @@ class Purchase:
                 purchase.purchased_at, purchase.timezone,
                 purchase.user_id,
                 purchase.bucket_id as bucket_id,
-                bucket.name as bucket_name
+                category.name as bucket_name
             FROM purchase
-            JOIN bucket USING (bucket_id)
+            JOIN category ON category.category_id = purchase.bucket_id
             WHERE purchase.user_id = ?
             ORDER BY purchased_at DESC;
             """, (user_id, ))
         
-        return [Purchase(**row) for row in cursor.fetchall()]
+        return cursor.fetchall()
     
     @classmethod
     def get(cls, conn: sqlite3.Connection, purchase_id: int):
         cursor = conn.cursor()
+        cursor.row_factory = purchase_factory
         cursor.execute(
             """
             SELECT 
@@ -51,5 +57,16 @@ class Purchase:
             WHERE purchase.purchase_id = ?;
             """, (purchase_id, ))
         
-        row = cursor.fetchone()
-        return Purchase(**row) if row else None
\ No newline at end of file
+        return cursor.fetchone()
+
+    @classmethod
+    async def get_user_purchases_async(cls, user_id: int):
+        return await db_executor.read(cls.get_user_purchases, user_id=user_id)
+
+    @classmethod
+    async def get_async(cls, purchase_id: int):
+        return await db_executor.read(cls.get, purchase_id=purchase_id)
+
+
+# purchased_at is left as the stored epoch until something formats it
+purchase_factory = model_factory(Purchase, {"purchased_at": lazy_epoch})
@@ -0,0 +1,90 @@
+"""
+Row factories that build models straight from the cursor's tuples, instead of going
+through sqlite3.Row and then a dict (or two) on the way to the model.
+
+    cursor = conn.cursor()
+    cursor.row_factory = purchase_factory
+    cursor.execute("SELECT purchase_id, amount, ... FROM purchase ...")
+    cursor.fetchall()  # [Purchase, ...]
+"""
+from dataclasses import fields
+from operator import itemgetter
+import sqlite3
+from typing import Callable, Dict, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+# descriptions remembered per factory, one per statement shape in use at a time is plenty
+_MAX_SHAPES = 64
+
+
+def _constructor(cls: Type[T], names: Tuple[str, ...], description) -> Callable[[tuple], T]:
+    columns = [column[0] for column in description]
+    if tuple(columns) == names[:len(columns)]:
+        # the columns are the model's leading fields, in order
+        return lambda row: cls(*row)
+
+    positions = [index for index, column in enumerate(columns) if column in names]
+    keys = [columns[index] for index in positions]
+    if len(positions) == 1:
+        position, key = positions[0], keys[0]
+        if key == names[0]:
+            return lambda row: cls(row[position])
+        return lambda row: cls(**{key: row[position]})
+
+    pick = itemgetter(*positions)
+    if tuple(keys) == names[:len(keys)]:
+        return lambda row: cls(*pick(row))
+    return lambda row: cls(**dict(zip(keys, pick(row))))
+
+
+def model_factory(cls: Type[T], decoders: Optional[Dict[str, Callable]] = None) -> Callable[[sqlite3.Cursor, tuple], T]:
+    """
+    A cursor.row_factory for a dataclass. Columns are matched to fields by name once per
+    statement, and when they're the model's leading fields in order, as the repositories
+    select them, each row is just cls(*row). Columns the model doesn't have are ignored.
+    decoders map a field to a function applied to its (non NULL) value after the model is built.
+    """
+    names = tuple(field.name for field in fields(cls))
+    decoders = decoders or {}
+    # id(description) -> (description, build); the description is kept so its id can't be reused
+    shapes: Dict[int, tuple] = {}
+    last = (None, None)
+
+    def shape(description) -> Callable[[tuple], T]:
+        construct = _constructor(cls, names, description)
+        active = tuple(
+            (index, column[0], decoders[column[0]])
+            for index, column in enumerate(description)
+            if column[0] in decoders
+        )
+        if not active:
+            return construct
+
+        def build(row):
+            model = construct(row)
+            for index, name, decode in active:
+                value = row[index]
+                if value is not None:
+                    setattr(model, name, decode(value))
+            return model
+        return build
+
+    def factory(cursor: sqlite3.Cursor, row: tuple) -> T:
+        nonlocal last
+        description = cursor.description
+        # read once: another database thread may rebind last between two reads
+        cached = last
+        if description is cached[0]:
+            return cached[1](row)
+
+        known = shapes.get(id(description))
+        if known is None or known[0] is not description:
+            if len(shapes) >= _MAX_SHAPES:
+                shapes.clear()
+            known = shapes[id(description)] = (description, shape(description))
+        # rebound as one tuple, so a single read always pairs a description with its build
+        last = known
+        return known[1](row)
+
+    return factory
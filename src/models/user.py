@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from typing import Optional
 
-@dataclass
+@dataclass(slots=True)
 class User:
     user_id: Optional[int] = None
     email: Optional[str] = None
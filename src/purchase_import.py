@@ -0,0 +1,287 @@
+"""
+Bulk CSV import of purchases.
+The upload is spooled to a temporary file and read twice, row by row, off the writer. The
+first pass only validates it, so a bad row can stop the import before anything is written.
+The second parses it again IMPORT_BATCH_SIZE rows at a time and queues each batch for the
+writer as its own executemany, so neither the rows nor the writer are held for the whole file.
+
+Columns (header row required, names are case insensitive):
+    date        YYYY-MM-DD or YYYY/MM/DD, required
+    amount      whole number above 0, required
+    time        HH:MM or HH:MM:SS, defaults to 00:00:00
+    category    name of one of the user's categories, blank for none
+    currency    defaults to TWD
+    timezone    defaults to the app's LOCAL_TIMEZONE
+"""
+from contextlib import contextmanager
+import csv
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+import io
+import os
+import sqlite3
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import Request
+
+from src import analytics, utils
+from src.executor import db_executor
+from src.respository import purchase_repository
+from src.respository.timestamps import local_day
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# bounds how long one upload takes to validate and import
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "100000"))
+# only this many errors are kept for the report, the rest are just counted
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+# uploads bigger than this are spooled to disk instead of memory
+IMPORT_SPOOL_BYTES = 1024 * 1024
+
+REQUIRED_COLUMNS = ("date", "amount")
+DEFAULT_CURRENCY = "TWD"
+
+
+@dataclass
+class RowError:
+    line: int
+    message: str
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    rows: int = 0
+    error_count: int = 0
+    errors: List[RowError] = field(default_factory=list)
+    committed: bool = False
+
+    def add_error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append(RowError(line=line, message=message))
+
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value.replace("/", "-"))
+    except ValueError:
+        return None
+
+
+def _parse_time(value: str) -> Optional[time]:
+    if not value:
+        return time()
+    try:
+        return time.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _zone(name: str, zones: Dict[str, Optional[ZoneInfo]]) -> Optional[ZoneInfo]:
+    if name not in zones:
+        try:
+            zones[name] = ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            zones[name] = None
+    return zones[name]
+
+
+def parse_rows(
+        lines: Iterator[str],
+        user_id: int,
+        categories: Dict[str, int],
+        result: ImportResult,
+        max_rows: int = IMPORT_MAX_ROWS
+        ) -> Iterator[Tuple]:
+    """
+    Yields purchase_repository.store_many tuples for the valid rows of a CSV and records
+    everything wrong with the others on result. categories maps lower cased names to ids.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        result.add_error(1, "The file is empty.")
+        return
+
+    columns = {name.strip().lower(): index for index, name in enumerate(header)}
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        result.add_error(1, f"Missing column(s): {', '.join(missing)}.")
+        return
+
+    def getter(name: str):
+        index = columns.get(name)
+        if index is None:
+            return lambda row: ""
+        return lambda row: row[index].strip() if index < len(row) else ""
+
+    get_date, get_time, get_amount = getter("date"), getter("time"), getter("amount")
+    get_category, get_currency, get_timezone = getter("category"), getter("currency"), getter("timezone")
+    zones = {}
+
+    for row in reader:
+        line = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+
+        result.rows += 1
+        if result.rows > max_rows:
+            result.add_error(line, f"Only {max_rows} rows can be imported at once.")
+            return
+
+        amount = get_amount(row).replace(",", "")
+        # isdecimal, not isdigit, which lets through characters like "²" that int() rejects
+        if not amount.isdecimal() or int(amount) < 1:
+            result.add_error(line, f"The amount needs to be a whole number above 0, got '{get_amount(row)}'.")
+            continue
+
+        purchase_date = _parse_date(get_date(row))
+        if purchase_date is None:
+            result.add_error(line, f"The date needs to look like 2024-12-31, got '{get_date(row)}'.")
+            continue
+
+        purchase_time = _parse_time(get_time(row))
+        if purchase_time is None:
+            result.add_error(line, f"The time needs to look like 13:45 or 13:45:00, got '{get_time(row)}'.")
+            continue
+
+        timezone_name = get_timezone(row) or utils.LOCAL_TIMEZONE
+        zone = _zone(timezone_name, zones)
+        if zone is None:
+            result.add_error(line, f"Unknown timezone '{timezone_name}'.")
+            continue
+
+        category_id = None
+        category_name = get_category(row)
+        if category_name:
+            category_id = categories.get(category_name.lower())
+            if category_id is None:
+                result.add_error(line, f"You don't have a category called '{category_name}'.")
+                continue
+
+        purchased_at = int(datetime.combine(purchase_date, purchase_time, tzinfo=zone).timestamp())
+        currency = get_currency(row).upper() or DEFAULT_CURRENCY
+
+        yield (int(amount), currency, purchased_at, timezone_name, user_id, category_id, local_day(purchased_at, timezone_name))
+
+
+def _batches(rows: Iterator[Tuple], size: int) -> Iterator[List[Tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_categories(conn: sqlite3.Connection, user_id: int) -> Dict[str, int]:
+    """The user's categories by lower cased name, what parse_rows matches the category column against"""
+    return {
+        row["name"].strip().lower(): row["category_id"]
+        for row in conn.execute("SELECT category_id, name FROM category WHERE user_id = ?;", (user_id, ))
+    }
+
+
+@contextmanager
+def _text(file: BinaryIO):
+    """The upload from its start as text, left open for whoever owns it"""
+    file.seek(0)
+    lines = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        yield lines
+    finally:
+        lines.detach()
+
+
+def validate_csv(user_id: int, file: BinaryIO, categories: Dict[str, int]) -> ImportResult:
+    """The first pass: parses and checks the whole upload without touching the database or keeping any rows"""
+    result = ImportResult()
+    with _text(file) as lines:
+        for _ in parse_rows(lines, user_id, categories, result):
+            pass
+    return result
+
+
+def read_batches(user_id: int, file: BinaryIO, categories: Dict[str, int], batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[List[Tuple]]:
+    """The second pass: the store_many tuples of the valid rows, batch_size at a time"""
+    with _text(file) as lines:
+        yield from _batches(parse_rows(lines, user_id, categories, ImportResult()), batch_size)
+
+
+def insert_rows(conn: sqlite3.Connection, rows: List[Tuple]) -> int:
+    """Inserts one batch of validated rows on the writer connection, in the caller's transaction"""
+    purchase_repository.store_many(conn, rows)
+    return len(rows)
+
+
+async def import_csv_async(user_id: int, file: BinaryIO, skip_invalid: bool = False) -> ImportResult:
+    """
+    Imports a CSV upload for user_id. Both passes over the file run on a database thread and
+    only the inserts are queued for the writer, one batch per write command. Unless
+    skip_invalid, a single bad row means nothing is written, so the file can be fixed and
+    uploaded again without duplicating anything. If a batch fails to write, the batches
+    before it stay imported and the result says where it stopped.
+    """
+    categories = await db_executor.read(load_categories, user_id=user_id)
+    result = await db_executor.run(validate_csv, user_id=user_id, file=file, categories=categories)
+
+    if result.error_count and not skip_invalid:
+        return result
+
+    batches = read_batches(user_id, file, categories)
+    failed = False
+    try:
+        while True:
+            batch = await db_executor.run(next, batches, None)
+            if batch is None:
+                break
+            try:
+                result.imported += await db_executor.write(insert_rows, rows=batch)
+            except sqlite3.Error:
+                failed = True
+                result.add_error(0, f"Saving failed after {result.imported} purchases, the rest of the file wasn't imported.")
+                break
+    finally:
+        try:
+            batches.close()
+        except ValueError:
+            # a cancelled request's next() is still running on its thread, the owner closes the file
+            pass
+
+    if result.imported:
+        analytics.invalidate(user_id)
+    result.committed = result.imported > 0 or not failed
+    return result
+
+
+async def read_upload(request: Request) -> Tuple[Optional[BinaryIO], dict]:
+    """
+    The CSV from a multipart form ("file" field) or a raw text/csv body, plus the other
+    form fields. Either way it ends up in a spooled temporary file, never whole in memory.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        fields = {key: value for key, value in form.items() if key != "file"}
+        if upload is None or isinstance(upload, str):
+            return None, fields
+        await upload.seek(0)
+        return upload.file, fields
+
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        # a form without a file input
+        return None, dict(await request.form())
+
+    spooled = SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    async for chunk in request.stream():
+        spooled.write(chunk)
+    if not spooled.tell():
+        spooled.close()
+        return None, dict(request.query_params)
+    spooled.seek(0)
+    return spooled, dict(request.query_params)
@@ -26,17 +26,17 @@ def get_with_top_up(conn: sqlite3.Connection, month_start, bucket_id):
     cursor.execute(
         """
         SELECT
-            b.bucket_id,
-            b.name,
-            b.is_daily,
+            c.category_id AS bucket_id,
+            c.name,
+            c.is_daily,
             btu.top_up_id,
             btu.month_start,
             btu.start_amount,
             btu.end_amount
-        FROM bucket AS b
+        FROM category AS c
         JOIN bucket_month_top_up AS btu
-        USING (bucket_id)
-        WHERE b.bucket_id = :bucket_id
+        ON btu.bucket_id = c.category_id
+        WHERE c.category_id = :bucket_id
         AND btu.month_start = :month_start;
         """,
         {"bucket_id": bucket_id, "month_start": month_start})
@@ -1,15 +1,26 @@
-from datetime import datetime
+import base64
+from datetime import date, datetime
+import os
 import sqlite3
+from typing import Iterator, List, Optional, Tuple
 
-from src.models.purchase import Purchase
+from src import analytics
+from src.config import pool
+from src.executor import db_executor
+from src.models.purchase import Purchase, purchase_factory
+from src.respository import spend_summary
+from src.respository.timestamps import local_day, to_epoch
 
+FETCH_CHUNK_SIZE = int(os.getenv("FETCH_CHUNK_SIZE", "200"))
 
-def list_for_period(user_id: int, period_start: datetime, period_end: datetime):
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.row_factory = sqlite3.Row
-        purchase_rows = conn.execute(
+
+def list_for_period(user_id: int, period_start: datetime, period_end: datetime) -> List[Purchase]:
+    with pool.reader() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = purchase_factory
+        return cursor.execute(
             """
-            SELECT * 
+            SELECT purchase_id, amount, currency, purchased_at, timezone, user_id, bucket_id
             FROM purchase 
             WHERE user_id = :user_id 
             AND purchased_at >= :period_start
@@ -17,28 +28,198 @@ def list_for_period(user_id: int, period_start: datetime, period_end: datetime):
             ORDER BY purchased_at DESC;""", 
             {
                 "user_id": user_id, 
-                "period_start": period_start.strftime('%Y-%m-%d %H:%M:%S'),
-                "period_end": period_end.strftime('%Y-%m-%d %H:%M:%S')
+                "period_start": to_epoch(period_start),
+                "period_end": to_epoch(period_end)
             }
             ).fetchall()
-        
-        return purchase_rows
     
-def list_for_user(user_id: int):
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.row_factory = sqlite3.Row
-        purchase_rows = conn.execute(
-            """SELECT * 
+def list_for_user(user_id: int) -> List[Purchase]:
+    with pool.reader() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = purchase_factory
+        return cursor.execute(
+            """SELECT purchase_id, amount, currency, purchased_at, timezone, user_id, bucket_id
             FROM purchase 
             WHERE user_id = :user_id 
             ORDER BY purchased_at DESC;""", 
             {"user_id": user_id}
             ).fetchall()
-        
-        return purchase_rows
 
-def get(conn: sqlite3.Connection, purchase_id: int):
+
+def iter_rows(cursor: sqlite3.Cursor, chunk_size: int = FETCH_CHUNK_SIZE) -> Iterator[Purchase]:
+    """Yields a cursor's purchases fetchmany chunk by chunk instead of materialising them all"""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def iter_for_period(
+        user_id: int,
+        period_start: datetime,
+        period_end: datetime,
+        chunk_size: int = FETCH_CHUNK_SIZE
+        ) -> Iterator[Purchase]:
+    """
+    Streaming version of list_for_period.
+    The pooled reader is held until the iterator is exhausted or closed,
+    so consume it promptly (e.g. from a streaming template response).
+    """
+    with pool.reader() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = purchase_factory
+        cursor.execute(
+            """
+            SELECT purchase_id, amount, currency, purchased_at, timezone, user_id, bucket_id
+            FROM purchase
+            WHERE user_id = :user_id
+            AND purchased_at >= :period_start
+            AND purchased_at < :period_end
+            ORDER BY purchased_at DESC;""",
+            {
+                "user_id": user_id,
+                "period_start": to_epoch(period_start),
+                "period_end": to_epoch(period_end)
+            }
+            )
+        yield from iter_rows(cursor, chunk_size)
+
+
+def iter_for_user(user_id: int, chunk_size: int = FETCH_CHUNK_SIZE) -> Iterator[Purchase]:
+    """Streaming version of list_for_user. Holds a pooled reader while it's being consumed."""
+    with pool.reader() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = purchase_factory
+        cursor.execute(
+            """SELECT purchase_id, amount, currency, purchased_at, timezone, user_id, bucket_id
+            FROM purchase
+            WHERE user_id = :user_id
+            ORDER BY purchased_at DESC;""",
+            {"user_id": user_id}
+            )
+        yield from iter_rows(cursor, chunk_size)
+
+
+def iter_export(
+        user_id: int,
+        utc_start: Optional[int] = None,
+        utc_end: Optional[int] = None,
+        category_id: Optional[int] = None,
+        chunk_size: int = FETCH_CHUNK_SIZE
+        ) -> Iterator[sqlite3.Row]:
+    """
+    A user's purchases oldest first with their category name, optionally within
+    [utc_start, utc_end) epoch seconds and one category. Runs on a dedicated read connection
+    that's closed when the iterator is exhausted or closed, so exports of any size never
+    take a pooled reader. Rows are left raw (purchased_at in epoch seconds).
+    """
+    with pool.dedicated_reader() as conn:
+        cursor = conn.execute(
+            """
+            SELECT
+                p.purchase_id,
+                p.amount,
+                p.currency,
+                p.purchased_at,
+                p.timezone,
+                p.bucket_id AS category_id,
+                c.name AS category_name
+            FROM purchase AS p
+            LEFT JOIN category AS c
+            ON c.category_id = p.bucket_id
+            WHERE p.user_id = :user_id
+            AND p.purchased_at >= :utc_start
+            AND p.purchased_at < :utc_end
+            AND (:category_id IS NULL OR p.bucket_id = :category_id)
+            ORDER BY p.purchased_at, p.purchase_id;
+            """,
+            {
+                "user_id": user_id,
+                "utc_start": utc_start if utc_start is not None else -2**63,
+                "utc_end": utc_end if utc_end is not None else 2**63 - 1,
+                "category_id": category_id
+            }
+            )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield from rows
+
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(purchase: Purchase) -> str:
+    """Opaque keyset cursor pointing just after purchase"""
+    raw = f"{to_epoch(purchase.purchased_at)}|{purchase.purchase_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[int, int]]:
+    try:
+        purchased_at, purchase_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return int(purchased_at), int(purchase_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def list_page_for_user(
+        conn: sqlite3.Connection,
+        user_id: int,
+        after: Optional[Tuple[int, int]] = None,
+        limit: int = PAGE_SIZE
+        ) -> Tuple[List[Purchase], Optional[str]]:
+    """
+    Returns one page of a user's purchases, newest first, and the cursor for the next page.
+    Seeks on (purchased_at, purchase_id) so every page costs the same no matter how deep it is.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = purchase_factory
+
+    if after is None:
+        cursor.execute(
+            """
+            SELECT purchase_id, amount, currency, purchased_at, timezone, user_id, bucket_id
+            FROM purchase
+            WHERE user_id = :user_id
+            ORDER BY purchased_at DESC, purchase_id DESC
+            LIMIT :limit;
+            """,
+            {"user_id": user_id, "limit": limit + 1}
+            )
+    else:
+        after_purchased_at, after_purchase_id = after
+        cursor.execute(
+            """
+            SELECT purchase_id, amount, currency, purchased_at, timezone, user_id, bucket_id
+            FROM purchase
+            WHERE user_id = :user_id
+            AND purchased_at <= :after_purchased_at
+            AND (purchased_at < :after_purchased_at OR purchase_id < :after_purchase_id)
+            ORDER BY purchased_at DESC, purchase_id DESC
+            LIMIT :limit;
+            """,
+            {
+                "user_id": user_id,
+                "after_purchased_at": after_purchased_at,
+                "after_purchase_id": after_purchase_id,
+                "limit": limit + 1
+            }
+            )
+
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+
+    return rows, next_cursor
+
+def get(conn: sqlite3.Connection, purchase_id: int) -> Optional[Purchase]:
     cursor = conn.cursor()
+    cursor.row_factory = purchase_factory
     cursor.execute(
         """
         SELECT 
@@ -53,76 +234,100 @@ def get(conn: sqlite3.Connection, purchase_id: int):
         WHERE purchase.purchase_id = ?;
         """, (purchase_id, ))
     
-    row = cursor.fetchone()
+    return cursor.fetchone()
 
-    if not row:
-        return None
-    
-    return Purchase(**row)
-
-def store(amount: int, currency: str, purchased_at: datetime, timezone: str, user_id: int):
-    with sqlite3.connect("db.sqlite3") as conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.row_factory = sqlite3.Row
+def store(conn: sqlite3.Connection, amount: int, currency: str, purchased_at: datetime, timezone: str, user_id: int):
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO purchase (
+            amount, currency, purchased_at, timezone, user_id, local_day
+        ) VALUES (
+            :amount, :currency, :purchased_at, :timezone, :user_id, :local_day
+        );
+        """, 
+        {
+            "amount": amount, 
+            "currency": currency, 
+            "purchased_at": to_epoch(purchased_at), 
+            "timezone": timezone,
+            "user_id": user_id,
+            "local_day": local_day(purchased_at, timezone)
+        })
+    return cursor.lastrowid
 
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO purchase (
-                amount, currency, purchased_at, timezone, user_id
-            ) VALUES (
-                :amount, :currency, :purchased_at, :timezone, :user_id
-            );
-            """, 
-            {
-                "amount": amount, 
-                "currency": currency, 
-                "purchased_at": purchased_at, 
-                "timezone": timezone,
-                "user_id": user_id
-            })
-        conn.commit()
-        return cursor.lastrowid
-
-def update(conn: sqlite3.Connection, amount: int, purchased_at: datetime, purchase_id: int):
-    conn.execute("PRAGMA foreign_keys = ON;")
-    conn.row_factory = sqlite3.Row
-    conn = conn.cursor()
-    conn.execute(
-        "UPDATE purchase SET amount = :amount, purchased_at = :purchased_at WHERE purchase_id = :purchase_id;", 
-        {"amount": amount, "purchased_at": purchased_at, "purchase_id": purchase_id}
+def store_many(conn: sqlite3.Connection, rows: List[Tuple]):
+    """
+    Inserts (amount, currency, purchased_at epoch, timezone, user_id, bucket_id, local_day) tuples
+    with one executemany, in the caller's transaction. Callers invalidate analytics once they've committed.
+    """
+    conn.executemany(
+        """INSERT INTO purchase (
+            amount, currency, purchased_at, timezone, user_id, bucket_id, local_day
+        ) VALUES (?, ?, ?, ?, ?, ?, ?);
+        """,
+        rows
         )
+
+def update(conn: sqlite3.Connection, amount: int, purchased_at: datetime, timezone: str, purchase_id: int):
+    """timezone is the purchase's own, it's what its local_day is worked out in"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """UPDATE purchase
+        SET amount = :amount, purchased_at = :purchased_at, local_day = :local_day
+        WHERE purchase_id = :purchase_id;""", 
+        {
+            "amount": amount,
+            "purchased_at": to_epoch(purchased_at),
+            "local_day": local_day(purchased_at, timezone),
+            "purchase_id": purchase_id
+        })
         
-def list_for_bucket_and_month(conn: sqlite3.Connection, bucket_id: int, utc_month_start, utc_month_end):
+def list_for_bucket_and_month(conn: sqlite3.Connection, bucket_id: int, utc_month_start, utc_month_end) -> List[Purchase]:
     cursor = conn.cursor()
-    
+    cursor.row_factory = purchase_factory
     cursor.execute("""
-                    SELECT * 
+                    SELECT purchase_id, amount, currency, purchased_at, timezone, user_id, bucket_id
                     FROM purchase 
                     WHERE bucket_id = ?
                     AND purchased_at >= ?
                     AND purchased_at < ?
-                    ORDER BY purchased_at DESC;""", (bucket_id, utc_month_start, utc_month_end))
+                    ORDER BY purchased_at DESC;""", (bucket_id, to_epoch(utc_month_start), to_epoch(utc_month_end)))
     
-    purchase_rows = cursor.fetchall()
+    return cursor.fetchall()
 
-    return purchase_rows
+def get_logged_spend_for_bucket_month(conn: sqlite3.Connection, bucket_id: int, month_start: date):
+    """Read from the trigger-maintained bucket_month_spend summary instead of summing purchases"""
+    return spend_summary.get_bucket_month_spend(conn, bucket_id=bucket_id, month_start=month_start)
 
-def get_logged_spend_for_bucket_month(conn: sqlite3.Connection, bucket_id: int, utc_month_start, utc_month_end):
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-                    SELECT TOTAL(amount) AS logged_spending
-                    FROM purchase 
-                    WHERE bucket_id = :bucket_id
-                    AND purchased_at >= :utc_month_start
-                    AND purchased_at < :utc_month_end;""",
-                    {
-                        "bucket_id": bucket_id,
-                        "utc_month_start": utc_month_start,
-                        "utc_month_end": utc_month_end
-                    }
-                )
-    
-    purchase_total = cursor.fetchone()
 
-    return purchase_total["logged_spending"]
\ No newline at end of file
+async def list_for_period_async(user_id: int, period_start: datetime, period_end: datetime):
+    return await db_executor.run(list_for_period, user_id=user_id, period_start=period_start, period_end=period_end)
+
+async def list_for_user_async(user_id: int):
+    return await db_executor.run(list_for_user, user_id=user_id)
+
+async def list_page_for_user_async(user_id: int, after: Optional[Tuple[int, int]] = None, limit: int = PAGE_SIZE):
+    return await db_executor.read(list_page_for_user, user_id=user_id, after=after, limit=limit)
+
+async def get_async(purchase_id: int):
+    return await db_executor.read(get, purchase_id=purchase_id)
+
+async def store_async(amount: int, currency: str, purchased_at: datetime, timezone: str, user_id: int):
+    purchase_id = await db_executor.write(
+        store, amount=amount, currency=currency, purchased_at=purchased_at, timezone=timezone, user_id=user_id
+        )
+    analytics.invalidate(user_id)
+    return purchase_id
+
+async def update_async(amount: int, purchased_at: datetime, timezone: str, purchase_id: int):
+    return await db_executor.write(
+        update, amount=amount, purchased_at=purchased_at, timezone=timezone, purchase_id=purchase_id
+        )
+
+async def list_for_bucket_and_month_async(bucket_id: int, utc_month_start, utc_month_end):
+    return await db_executor.read(
+        list_for_bucket_and_month, bucket_id=bucket_id, utc_month_start=utc_month_start, utc_month_end=utc_month_end
+        )
+
+async def get_logged_spend_for_bucket_month_async(bucket_id: int, month_start: date):
+    return await db_executor.read(get_logged_spend_for_bucket_month, bucket_id=bucket_id, month_start=month_start)
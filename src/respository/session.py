@@ -1,5 +1,32 @@
 import sqlite3
 
+from src.executor import db_executor
+
+
+def get_session(conn: sqlite3.Connection, token: str) -> sqlite3.Row:
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM session WHERE token = ?;", (token, ))
+    return cursor.fetchone()
+
+
+def get_session_user(conn: sqlite3.Connection, token: str) -> sqlite3.Row:
+    """Resolves a token to its session and user in one lookup on the unique token index"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT
+            s.session_id,
+            s.expires_at,
+            u.user_id,
+            u.email
+        FROM session AS s
+        JOIN user AS u USING (user_id)
+        WHERE s.token = :token;
+        """,
+        {"token": token}
+        )
+    return cursor.fetchone()
+
 
 def store_session(conn: sqlite3.Connection, token, user_id, expires_at) -> None:
     cursor = conn.cursor()
@@ -7,3 +34,46 @@ def store_session(conn: sqlite3.Connection, token, user_id, expires_at) -> None:
         "INSERT INTO session (token, user_id, expires_at) VALUES (:token, :user_id, :expires_at);",
         {"token": token, "user_id": user_id, "expires_at": expires_at}
         )
+
+
+def delete_session(conn: sqlite3.Connection, session_id: int) -> None:
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM session WHERE session_id = ?;", (session_id, ))
+
+
+def delete_expired_sessions(conn: sqlite3.Connection, now: int, limit: int) -> int:
+    """Deletes up to limit expired sessions and returns how many were removed"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        DELETE FROM session
+        WHERE session_id IN (
+            SELECT session_id
+            FROM session
+            WHERE expires_at <= :now
+            LIMIT :limit
+        );
+        """,
+        {"now": now, "limit": limit}
+        )
+    return cursor.rowcount
+
+
+async def get_session_async(token: str) -> sqlite3.Row:
+    return await db_executor.read(get_session, token=token)
+
+
+async def get_session_user_async(token: str) -> sqlite3.Row:
+    return await db_executor.read(get_session_user, token=token)
+
+
+async def store_session_async(token, user_id, expires_at) -> None:
+    await db_executor.write(store_session, token=token, user_id=user_id, expires_at=expires_at)
+
+
+async def delete_session_async(session_id: int) -> None:
+    await db_executor.write(delete_session, session_id=session_id)
+
+
+async def delete_expired_sessions_async(now: int, limit: int) -> int:
+    return await db_executor.write(delete_expired_sessions, now=now, limit=limit)
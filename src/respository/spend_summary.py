@@ -0,0 +1,137 @@
+"""
+Reads for the bucket_month_spend and bucket_day_spend summary tables.
+They're kept up to date by triggers on purchase, see migrations 20261018_04 and 20261018_07.
+Purchases without a category are summarised under bucket_id 0.
+"""
+from datetime import date
+import sqlite3
+from typing import List, Optional
+
+from src.executor import db_executor
+
+NO_BUCKET_ID = 0
+
+# a purchase's local day, from the local_day written with it (migration 20261018_07), or
+# for rows written without one the fixed timezone_offset the triggers fall back to
+_LOCAL_DAY = (
+    "COALESCE(p.local_day, strftime('%Y-%m-%d', p.purchased_at, 'unixepoch', "
+    "COALESCE(tz.offset_minutes, 0) || ' minutes'))"
+)
+
+# what the summary tables should contain, worked out from purchase directly
+_EXPECTED_MONTHS = f"""
+    SELECT
+        p.user_id,
+        COALESCE(p.bucket_id, 0) AS bucket_id,
+        substr({_LOCAL_DAY}, 1, 8) || '01' AS month_start,
+        SUM(p.amount) AS total_amount,
+        COUNT(*) AS purchase_count
+    FROM purchase AS p
+    LEFT JOIN timezone_offset AS tz USING (timezone)
+    GROUP BY 1, 2, 3
+"""
+
+_EXPECTED_DAYS = f"""
+    SELECT
+        p.user_id,
+        COALESCE(p.bucket_id, 0) AS bucket_id,
+        {_LOCAL_DAY} AS day,
+        SUM(p.amount) AS total_amount,
+        COUNT(*) AS purchase_count
+    FROM purchase AS p
+    LEFT JOIN timezone_offset AS tz USING (timezone)
+    GROUP BY 1, 2, 3
+"""
+
+
+def get_bucket_month_spend(conn: sqlite3.Connection, bucket_id: int, month_start: date) -> int:
+    row = conn.execute(
+        """
+        SELECT TOTAL(total_amount) AS total_spent
+        FROM bucket_month_spend
+        WHERE bucket_id = :bucket_id
+        AND month_start = :month_start;
+        """,
+        {"bucket_id": bucket_id, "month_start": month_start.strftime("%Y-%m-01")}
+        ).fetchone()
+
+    return int(row["total_spent"])
+
+
+def get_user_day_spend(conn: sqlite3.Connection, user_id: int, day: date, bucket_id: Optional[int] = None) -> int:
+    """What the user spent on their local day, across all buckets unless bucket_id is given"""
+    row = conn.execute(
+        """
+        SELECT TOTAL(total_amount) AS total_spent
+        FROM bucket_day_spend
+        WHERE user_id = :user_id
+        AND day = :day
+        AND (:bucket_id IS NULL OR bucket_id = :bucket_id);
+        """,
+        {"user_id": user_id, "day": day.strftime("%Y-%m-%d"), "bucket_id": bucket_id}
+        ).fetchone()
+
+    return int(row["total_spent"])
+
+
+def get_user_period_spend(conn: sqlite3.Connection, user_id: int, bucket_id: int, first_day: date, last_day: date) -> int:
+    """What the user spent in a bucket from first_day to last_day, both inclusive"""
+    row = conn.execute(
+        """
+        SELECT TOTAL(total_amount) AS total_spent
+        FROM bucket_day_spend
+        WHERE bucket_id = :bucket_id
+        AND day BETWEEN :first_day AND :last_day
+        AND user_id = :user_id;
+        """,
+        {
+            "user_id": user_id,
+            "bucket_id": bucket_id,
+            "first_day": first_day.strftime("%Y-%m-%d"),
+            "last_day": last_day.strftime("%Y-%m-%d")
+        }
+        ).fetchone()
+
+    return int(row["total_spent"])
+
+
+def rebuild(conn: sqlite3.Connection):
+    """Recomputes both summary tables from purchase. Run it inside a write transaction."""
+    conn.execute("DELETE FROM bucket_month_spend;")
+    conn.execute("DELETE FROM bucket_day_spend;")
+    conn.execute(
+        f"""INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+        {_EXPECTED_MONTHS};"""
+        )
+    conn.execute(
+        f"""INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+        {_EXPECTED_DAYS};"""
+        )
+
+
+def find_drift(conn: sqlite3.Connection) -> List[str]:
+    """Summary rows that don't match purchase, described one per line. Empty when everything agrees."""
+    drift = []
+    checks = [
+        ("bucket_month_spend", "month_start", _EXPECTED_MONTHS),
+        ("bucket_day_spend", "day", _EXPECTED_DAYS),
+    ]
+    for table, period, expected in checks:
+        stored = f"SELECT user_id, bucket_id, {period}, total_amount, purchase_count FROM {table}"
+        for label, query in (("missing", f"{expected} EXCEPT {stored}"), ("unexpected", f"{stored} EXCEPT {expected}")):
+            for row in conn.execute(query):
+                drift.append(f"{table} {label}: {tuple(row)}")
+
+    return drift
+
+
+async def get_bucket_month_spend_async(bucket_id: int, month_start: date) -> int:
+    return await db_executor.read(get_bucket_month_spend, bucket_id=bucket_id, month_start=month_start)
+
+async def get_user_day_spend_async(user_id: int, day: date, bucket_id: Optional[int] = None) -> int:
+    return await db_executor.read(get_user_day_spend, user_id=user_id, day=day, bucket_id=bucket_id)
+
+async def get_user_period_spend_async(user_id: int, bucket_id: int, first_day: date, last_day: date) -> int:
+    return await db_executor.read(
+        get_user_period_spend, user_id=user_id, bucket_id=bucket_id, first_day=first_day, last_day=last_day
+        )
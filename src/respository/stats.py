@@ -0,0 +1,131 @@
+"""
+Spending aggregates for the stats page.
+Everything is computed in SQL over bucket_day_spend, so a range costs one row per
+day (or week, month, bucket) no matter how many purchases it holds.
+"""
+from datetime import date
+import sqlite3
+
+from src.executor import db_executor
+
+
+def get_spending_stats(conn: sqlite3.Connection, user_id: int, first_day: date, last_day: date) -> dict:
+    params = {
+        "user_id": user_id,
+        "first_day": first_day.strftime("%Y-%m-%d"),
+        "last_day": last_day.strftime("%Y-%m-%d"),
+        "first_month": first_day.strftime("%Y-%m-01"),
+    }
+
+    # per bucket totals, their share of the period and what's left of each bucket's top ups
+    buckets = conn.execute(
+        """
+        WITH spend AS (
+            SELECT bucket_id, SUM(total_amount) AS spent, SUM(purchase_count) AS purchases
+            FROM bucket_day_spend
+            WHERE user_id = :user_id
+            AND day BETWEEN :first_day AND :last_day
+            GROUP BY bucket_id
+        ),
+        budget AS (
+            SELECT t.bucket_id, SUM(t.start_amount) AS budget
+            FROM category AS c
+            JOIN bucket_month_top_up AS t ON t.bucket_id = c.category_id
+            WHERE c.user_id = :user_id
+            AND t.month_start BETWEEN :first_month AND :last_day
+            GROUP BY t.bucket_id
+        )
+        SELECT
+            spend.bucket_id,
+            COALESCE(c.name, 'Uncategorised') AS name,
+            spend.spent,
+            spend.purchases,
+            ROUND(100.0 * spend.spent / SUM(spend.spent) OVER (), 1) AS share,
+            budget.budget,
+            budget.budget - spend.spent AS remaining
+        FROM spend
+        LEFT JOIN category AS c ON c.category_id = spend.bucket_id
+        LEFT JOIN budget ON budget.bucket_id = spend.bucket_id
+        ORDER BY spend.spent DESC;
+        """,
+        params
+        ).fetchall()
+
+    budget = int(conn.execute(
+        """
+        SELECT TOTAL(t.start_amount) AS budget
+        FROM category AS c
+        JOIN bucket_month_top_up AS t ON t.bucket_id = c.category_id
+        WHERE c.user_id = :user_id
+        AND t.month_start BETWEEN :first_month AND :last_day;
+        """,
+        params
+        ).fetchone()["budget"])
+
+    # running_total and remaining carry across days with no spending
+    daily = conn.execute(
+        """
+        SELECT
+            day,
+            SUM(total_amount) AS spent,
+            SUM(purchase_count) AS purchases,
+            SUM(SUM(total_amount)) OVER (ORDER BY day) AS running_total,
+            :budget - SUM(SUM(total_amount)) OVER (ORDER BY day) AS remaining
+        FROM bucket_day_spend
+        WHERE user_id = :user_id
+        AND day BETWEEN :first_day AND :last_day
+        GROUP BY day
+        ORDER BY day;
+        """,
+        {**params, "budget": budget}
+        ).fetchall()
+
+    # weeks start on Monday
+    weekly = conn.execute(
+        """
+        SELECT
+            date(day, '-6 days', 'weekday 1') AS week_start,
+            SUM(total_amount) AS spent,
+            SUM(purchase_count) AS purchases,
+            SUM(SUM(total_amount)) OVER (ORDER BY date(day, '-6 days', 'weekday 1')) AS running_total
+        FROM bucket_day_spend
+        WHERE user_id = :user_id
+        AND day BETWEEN :first_day AND :last_day
+        GROUP BY week_start
+        ORDER BY week_start;
+        """,
+        params
+        ).fetchall()
+
+    monthly = conn.execute(
+        """
+        SELECT
+            substr(day, 1, 7) AS month,
+            SUM(total_amount) AS spent,
+            SUM(purchase_count) AS purchases,
+            SUM(SUM(total_amount)) OVER (ORDER BY substr(day, 1, 7)) AS running_total
+        FROM bucket_day_spend
+        WHERE user_id = :user_id
+        AND day BETWEEN :first_day AND :last_day
+        GROUP BY month
+        ORDER BY month;
+        """,
+        params
+        ).fetchall()
+
+    total_spent = sum(row["spent"] for row in buckets)
+
+    return {
+        "total_spent": total_spent,
+        "purchases": sum(row["purchases"] for row in buckets),
+        "budget": budget,
+        "remaining": budget - total_spent,
+        "buckets": [dict(row) for row in buckets],
+        "daily": [dict(row) for row in daily],
+        "weekly": [dict(row) for row in weekly],
+        "monthly": [dict(row) for row in monthly],
+    }
+
+
+async def get_spending_stats_async(user_id: int, first_day: date, last_day: date) -> dict:
+    return await db_executor.read(get_spending_stats, user_id=user_id, first_day=first_day, last_day=last_day)
@@ -0,0 +1,51 @@
+"""
+The one place purchase times are converted between Python and the database.
+purchased_at is stored as INTEGER seconds since the epoch, in UTC.
+"""
+from datetime import datetime, timezone
+from typing import Union
+
+from src.utils import LocalTime, to_local
+
+TEXT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def to_epoch(value: Union[datetime, LocalTime, str, int]) -> int:
+    """
+    Accepts what the controllers have historically passed in: datetimes and
+    '%Y-%m-%d %H:%M:%S' strings. Naive values are taken to be UTC.
+    """
+    if isinstance(value, int):
+        return value
+
+    if isinstance(value, LocalTime):
+        return value.epoch
+
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return int(value.timestamp())
+
+
+def from_epoch(value: int) -> datetime:
+    """Aware UTC datetime for a stored epoch"""
+    return datetime.fromtimestamp(value, timezone.utc)
+
+
+def local_day(value: Union[datetime, LocalTime, str, int], timezone_name: str) -> str:
+    """
+    The purchase's calendar day where it was made, as stored in purchase.local_day.
+    The spend summary triggers bucket by it, so DST and zones sqlite can't work out are right.
+    """
+    return to_local(to_epoch(value), timezone_name).strftime("%Y-%m-%d")
+
+
+def lazy_epoch(value: int) -> LocalTime:
+    """
+    A stored epoch as a UTC LocalTime, for row factories. Nothing is decoded until it's
+    formatted or converted, and strftime() usually doesn't need a datetime at all.
+    """
+    return LocalTime(value, "UTC", 0)
@@ -0,0 +1,18 @@
+import sqlite3
+from typing import Optional
+
+from src.models.bucket_month_top_up import BucketMonthTopUp, top_up_factory
+
+
+def get_for_user(conn: sqlite3.Connection, top_up_id: int, user_id: int) -> Optional[BucketMonthTopUp]:
+    """The top-up, if it belongs to one of user_id's categories"""
+    cursor = conn.cursor()
+    cursor.row_factory = top_up_factory
+    cursor.execute("""
+                   SELECT btu.top_up_id, btu.month_start, btu.start_amount, btu.end_amount, btu.bucket_id
+                   FROM bucket_month_top_up btu
+                   JOIN category c ON c.category_id = btu.bucket_id
+                   WHERE btu.top_up_id = ?
+                   AND c.user_id = ?;""",
+                   (top_up_id, user_id))
+    return cursor.fetchone()
@@ -1,9 +1,31 @@
 import sqlite3
+from typing import Optional
+
+from src.executor import db_executor
 
 
 def get_user_with_password(conn: sqlite3.Connection, email: str) -> sqlite3.Row:
-    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     cursor.execute("SELECT user_id, email, hashed_password FROM user WHERE email = ?;", (email, ))
     db_user = cursor.fetchone()
     return db_user
+
+
+def store_user(conn: sqlite3.Connection, email: str, hashed_password: str) -> int:
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO user (email, hashed_password) VALUES (?, ?);", (email, hashed_password))
+    return cursor.lastrowid
+
+
+def get_data_version(conn: sqlite3.Connection, user_id: int) -> Optional[int]:
+    """Goes up on every write to the user's purchases, categories and top ups, see migration 20261018_06"""
+    row = conn.execute("SELECT data_version FROM user WHERE user_id = ?;", (user_id, )).fetchone()
+    return row["data_version"] if row else None
+
+
+async def get_user_with_password_async(email: str) -> sqlite3.Row:
+    return await db_executor.read(get_user_with_password, email=email)
+
+
+async def store_user_async(email: str, hashed_password: str) -> int:
+    return await db_executor.write(store_user, email=email, hashed_password=hashed_password)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 
 from src.controllers.web import user
 from src.controllers.web import application, auth, bucket, public, purchase, top_up
-from src.dependencies import is_purchase_owner, is_top_up_owner, is_user
+from src.dependencies import if_none_match, is_purchase_owner, is_top_up_owner, is_user
 
 router = APIRouter()
 
@@ -16,19 +16,22 @@ routes = [
     ("POST",    "/session",                         auth.session,       [Depends(is_user)]),
     ("GET",     "/logout",                          auth.logout,        [Depends(is_user)]),
 
-    ("GET",     "/today",                           application.today,  [Depends(is_user)]),
+    ("GET",     "/today",                           application.today,  [Depends(is_user), Depends(if_none_match)]),
     ("POST",     "/today",                           application.store,  [Depends(is_user)]),
-    # ("GET",     "/stats",                           application.stats,  [Depends(is_user)]),
+    ("GET",     "/stats",                           application.stats,  [Depends(is_user), Depends(if_none_match)]),
     
-    ("GET",     "/purchases",                       purchase.list,      [Depends(is_user)]),
+    ("GET",     "/purchases",                       purchase.list,      [Depends(is_user), Depends(if_none_match)]),
     ("POST",    "/purchases",                       purchase.create,    [Depends(is_user)]),
     ("GET",     "/purchases/new",                   purchase.new,       [Depends(is_user)]),
+    ("GET",     "/purchases/import",                purchase.import_form,       [Depends(is_user)]),
+    ("POST",    "/purchases/import",                purchase.import_purchases,  [Depends(is_user)]),
+    ("GET",     "/purchases/export",                purchase.export,            [Depends(is_user)]),
     ("GET",     "/purchases/{purchase_id}",         purchase.show,      [Depends(is_user), Depends(is_purchase_owner)]),
     ("GET",     "/purchases/{purchase_id}/edit",    purchase.edit,      [Depends(is_user), Depends(is_purchase_owner)]),
     ("PUT",     "/purchases/{purchase_id}",         purchase.update,    [Depends(is_user), Depends(is_purchase_owner)]),
     ("DELETE",  "/purchases/{purchase_id}",         purchase.delete,    [Depends(is_user), Depends(is_purchase_owner)]),
 
-    ("GET",     "/me",                              user.me,            [Depends(is_user)]),
+    ("GET",     "/me",                              user.me,            [Depends(is_user), Depends(if_none_match)]),
 
     ("POST",    "/buckets",                         bucket.create,      [Depends(is_user)]),
     ("POST",    "/buckets/daily",                   bucket.create,      [Depends(is_user)]),
@@ -38,7 +41,9 @@ routes = [
 
     ("DELETE",  "/top-up/{top_up_id}",              top_up.delete,      [Depends(is_user), Depends(is_top_up_owner)]),
 
-    ("DELETE",  "/toast/delete",                    application.delete_toast,   [])
+    ("DELETE",  "/toast/delete",                    application.delete_toast,   []),
+
+    ("GET",     "/metrics/db",                      application.db_metrics,     [Depends(is_user)])
 ]
 
 for method, path, handler, dependencies in routes:
@@ -0,0 +1,56 @@
+""" In-memory cache from session token to the resolved user """
+from collections import OrderedDict
+import os
+import threading
+import time
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = int(os.getenv("SESSION_CACHE_TTL", "300"))
+
+
+class SessionCache:
+    """
+    Bounded LRU cache of token -> user.
+    An entry is dropped when the session expires or after ttl seconds,
+    whichever comes first, so a logout on another worker is picked up eventually.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+
+            user, valid_until = entry
+            if now >= valid_until:
+                del self._entries[token]
+                return None
+
+            self._entries.move_to_end(token)
+            return user
+
+    def set(self, token: str, user, expires_at: int):
+        valid_until = min(expires_at, time.time() + self.ttl)
+        with self._lock:
+            self._entries[token] = (user, valid_until)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+session_cache = SessionCache(max_size=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
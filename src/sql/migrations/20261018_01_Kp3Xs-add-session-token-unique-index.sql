@@ -0,0 +1,9 @@
+-- Add session token unique index
+-- depends: 20260821_01_qvONY-alter-bucket-table-rename-to-category
+
+DELETE FROM session
+WHERE session_id NOT IN (
+    SELECT MIN(session_id) FROM session GROUP BY token
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_session_token ON session(token);
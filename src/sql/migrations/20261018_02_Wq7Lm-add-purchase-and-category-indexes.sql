@@ -0,0 +1,16 @@
+-- Add purchase and category indexes
+-- depends: 20261018_01_Kp3Xs-add-session-token-unique-index
+
+-- list_for_period / list_for_user
+CREATE INDEX IF NOT EXISTS idx_purchase_user_purchased_at
+ON purchase(user_id, purchased_at, amount);
+
+-- get_logged_spend_for_bucket_month / list_for_bucket_and_month
+CREATE INDEX IF NOT EXISTS idx_purchase_bucket_purchased_at
+ON purchase(bucket_id, purchased_at, amount);
+
+-- daily bucket lookups and category lists
+CREATE INDEX IF NOT EXISTS idx_category_user_is_daily
+ON category(user_id, is_daily);
+
+-- user(email) is already covered by the UNIQUE constraint's automatic index
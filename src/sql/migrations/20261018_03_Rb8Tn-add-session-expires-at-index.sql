@@ -0,0 +1,4 @@
+-- Add session expires_at index
+-- depends: 20261018_02_Wq7Lm-add-purchase-and-category-indexes
+
+CREATE INDEX IF NOT EXISTS idx_session_expires_at ON session(expires_at);
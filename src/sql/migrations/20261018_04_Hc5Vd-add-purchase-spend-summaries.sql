@@ -0,0 +1,146 @@
+-- Add purchase spend summaries
+-- depends: 20261018_03_Rb8Tn-add-session-expires-at-index
+
+-- UTC offset used to work out a purchase's local day and month.
+-- Offsets are fixed, so zones with daylight saving need scripts/rebuild_spend_summaries.py
+-- after their offset row is changed.
+CREATE TABLE timezone_offset (
+    timezone TEXT PRIMARY KEY,
+    offset_minutes INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT INTO timezone_offset (timezone, offset_minutes) VALUES ('UTC', 0), ('Asia/Taipei', 480);
+
+-- bucket_id 0 holds purchases that aren't in a category
+CREATE TABLE bucket_month_spend (
+    user_id INTEGER NOT NULL,
+    bucket_id INTEGER NOT NULL,
+    month_start TEXT NOT NULL,
+    total_amount INTEGER NOT NULL DEFAULT 0,
+    purchase_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month_start, bucket_id)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_bucket_month_spend_bucket_month ON bucket_month_spend(bucket_id, month_start);
+
+CREATE TABLE bucket_day_spend (
+    user_id INTEGER NOT NULL,
+    bucket_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    total_amount INTEGER NOT NULL DEFAULT 0,
+    purchase_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, bucket_id)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_bucket_day_spend_bucket_day ON bucket_day_spend(bucket_id, day);
+
+INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+SELECT
+    p.user_id,
+    COALESCE(p.bucket_id, 0),
+    strftime('%Y-%m-01', p.purchased_at, COALESCE(tz.offset_minutes, 0) || ' minutes'),
+    SUM(p.amount),
+    COUNT(*)
+FROM purchase AS p
+LEFT JOIN timezone_offset AS tz USING (timezone)
+GROUP BY 1, 2, 3;
+
+INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+SELECT
+    p.user_id,
+    COALESCE(p.bucket_id, 0),
+    strftime('%Y-%m-%d', p.purchased_at, COALESCE(tz.offset_minutes, 0) || ' minutes'),
+    SUM(p.amount),
+    COUNT(*)
+FROM purchase AS p
+LEFT JOIN timezone_offset AS tz USING (timezone)
+GROUP BY 1, 2, 3;
+
+CREATE TRIGGER purchase_spend_after_insert AFTER INSERT ON purchase
+BEGIN
+    INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(NEW.bucket_id, 0),
+        strftime('%Y-%m-01', NEW.purchased_at, COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes'),
+        NEW.amount,
+        1
+    )
+    ON CONFLICT (user_id, month_start, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(NEW.bucket_id, 0),
+        strftime('%Y-%m-%d', NEW.purchased_at, COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes'),
+        NEW.amount,
+        1
+    )
+    ON CONFLICT (user_id, day, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+END;
+
+CREATE TRIGGER purchase_spend_after_delete AFTER DELETE ON purchase
+BEGIN
+    UPDATE bucket_month_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND month_start = strftime('%Y-%m-01', OLD.purchased_at, COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes');
+
+    UPDATE bucket_day_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND day = strftime('%Y-%m-%d', OLD.purchased_at, COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes');
+
+    DELETE FROM bucket_month_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+    DELETE FROM bucket_day_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+END;
+
+-- an update can move a purchase to another bucket, day or month, so take the old
+-- row out of its summaries and add the new row to its own
+CREATE TRIGGER purchase_spend_after_update AFTER UPDATE OF amount, purchased_at, timezone, user_id, bucket_id ON purchase
+BEGIN
+    UPDATE bucket_month_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND month_start = strftime('%Y-%m-01', OLD.purchased_at, COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes');
+
+    UPDATE bucket_day_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND day = strftime('%Y-%m-%d', OLD.purchased_at, COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes');
+
+    INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(NEW.bucket_id, 0),
+        strftime('%Y-%m-01', NEW.purchased_at, COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes'),
+        NEW.amount,
+        1
+    )
+    ON CONFLICT (user_id, month_start, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(NEW.bucket_id, 0),
+        strftime('%Y-%m-%d', NEW.purchased_at, COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes'),
+        NEW.amount,
+        1
+    )
+    ON CONFLICT (user_id, day, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    DELETE FROM bucket_month_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+    DELETE FROM bucket_day_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+END;
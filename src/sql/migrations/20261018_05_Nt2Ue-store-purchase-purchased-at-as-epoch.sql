@@ -0,0 +1,127 @@
+-- Store purchase purchased_at as a UTC epoch
+-- depends: 20261018_04_Hc5Vd-add-purchase-spend-summaries
+
+-- purchased_at goes from '%Y-%m-%d %H:%M:%S' TEXT to INTEGER seconds since the epoch (UTC).
+-- Dropping the old table drops its indexes and spend triggers, so both are recreated below.
+CREATE TABLE purchase_new(
+            purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount INTEGER NOT NULL,
+            currency TEXT NOT NULL,
+            lotto_number TEXT,
+            purchased_at INTEGER NOT NULL,
+            timezone TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT,
+            user_id INTEGER NOT NULL,
+            bucket_id INTEGER,
+            FOREIGN KEY(user_id) REFERENCES user(user_id) ON DELETE CASCADE,
+            FOREIGN KEY(bucket_id) REFERENCES category(category_id) ON DELETE CASCADE
+        );
+
+INSERT INTO purchase_new (
+    purchase_id, amount, currency, lotto_number,
+    purchased_at, timezone, created_at, updated_at, user_id, bucket_id
+)
+SELECT
+    purchase_id, amount, currency, lotto_number,
+    CAST(strftime('%s', purchased_at) AS INTEGER), timezone, created_at, updated_at, user_id, bucket_id
+FROM purchase;
+
+DROP TABLE purchase;
+
+ALTER TABLE purchase_new RENAME TO purchase;
+
+CREATE INDEX idx_purchase_user_purchased_at
+ON purchase(user_id, purchased_at, amount);
+
+CREATE INDEX idx_purchase_bucket_purchased_at
+ON purchase(bucket_id, purchased_at, amount);
+
+CREATE TRIGGER purchase_spend_after_insert AFTER INSERT ON purchase
+BEGIN
+    INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(NEW.bucket_id, 0),
+        strftime('%Y-%m-01', NEW.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes'),
+        NEW.amount,
+        1
+    )
+    ON CONFLICT (user_id, month_start, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(NEW.bucket_id, 0),
+        strftime('%Y-%m-%d', NEW.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes'),
+        NEW.amount,
+        1
+    )
+    ON CONFLICT (user_id, day, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+END;
+
+CREATE TRIGGER purchase_spend_after_delete AFTER DELETE ON purchase
+BEGIN
+    UPDATE bucket_month_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND month_start = strftime('%Y-%m-01', OLD.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes');
+
+    UPDATE bucket_day_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND day = strftime('%Y-%m-%d', OLD.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes');
+
+    DELETE FROM bucket_month_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+    DELETE FROM bucket_day_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+END;
+
+-- an update can move a purchase to another bucket, day or month, so take the old
+-- row out of its summaries and add the new row to its own
+CREATE TRIGGER purchase_spend_after_update AFTER UPDATE OF amount, purchased_at, timezone, user_id, bucket_id ON purchase
+BEGIN
+    UPDATE bucket_month_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND month_start = strftime('%Y-%m-01', OLD.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes');
+
+    UPDATE bucket_day_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND day = strftime('%Y-%m-%d', OLD.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes');
+
+    INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(NEW.bucket_id, 0),
+        strftime('%Y-%m-01', NEW.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes'),
+        NEW.amount,
+        1
+    )
+    ON CONFLICT (user_id, month_start, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+    VALUES (
+        NEW.user_id,
+        COALESCE(NEW.bucket_id, 0),
+        strftime('%Y-%m-%d', NEW.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes'),
+        NEW.amount,
+        1
+    )
+    ON CONFLICT (user_id, day, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    DELETE FROM bucket_month_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+    DELETE FROM bucket_day_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+END;
@@ -0,0 +1,64 @@
+-- Add user data version
+-- depends: 20261018_05_Nt2Ue-store-purchase-purchased-at-as-epoch
+
+-- bumped on every write to a user's purchases, categories and top ups, used for ETags
+ALTER TABLE user ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER user_data_version_purchase_insert
+AFTER INSERT ON purchase
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id = NEW.user_id;
+END;
+
+CREATE TRIGGER user_data_version_purchase_update
+AFTER UPDATE ON purchase
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id IN (OLD.user_id, NEW.user_id);
+END;
+
+CREATE TRIGGER user_data_version_purchase_delete
+AFTER DELETE ON purchase
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id = OLD.user_id;
+END;
+
+CREATE TRIGGER user_data_version_category_insert
+AFTER INSERT ON category
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id = NEW.user_id;
+END;
+
+CREATE TRIGGER user_data_version_category_update
+AFTER UPDATE ON category
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id IN (OLD.user_id, NEW.user_id);
+END;
+
+CREATE TRIGGER user_data_version_category_delete
+AFTER DELETE ON category
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id = OLD.user_id;
+END;
+
+CREATE TRIGGER user_data_version_top_up_insert
+AFTER INSERT ON bucket_month_top_up
+BEGIN
+    UPDATE user SET data_version = data_version + 1
+    WHERE user_id = (SELECT user_id FROM category WHERE category_id = NEW.bucket_id);
+END;
+
+CREATE TRIGGER user_data_version_top_up_update
+AFTER UPDATE ON bucket_month_top_up
+BEGIN
+    UPDATE user SET data_version = data_version + 1
+    WHERE user_id IN (
+        SELECT user_id FROM category WHERE category_id IN (OLD.bucket_id, NEW.bucket_id)
+    );
+END;
+
+CREATE TRIGGER user_data_version_top_up_delete
+AFTER DELETE ON bucket_month_top_up
+BEGIN
+    UPDATE user SET data_version = data_version + 1
+    WHERE user_id = (SELECT user_id FROM category WHERE category_id = OLD.bucket_id);
+END;
@@ -0,0 +1,126 @@
+"""
+Add purchase local day
+
+The spend summaries bucketed purchases by a fixed offset from timezone_offset, which only
+knows UTC and Asia/Taipei and can't follow daylight saving. local_day is the purchase's
+calendar day in its own timezone, worked out in Python when the purchase is written, and
+the triggers now read it. The offset expression is only a fallback for rows written
+without one.
+"""
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from yoyo import step
+
+__depends__ = {'20261018_06_Dv3Kp-add-user-data-version'}
+
+
+def _fallback_day(row: str) -> str:
+    return (
+        f"strftime('%Y-%m-%d', {row}.purchased_at, 'unixepoch', "
+        f"COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = {row}.timezone), 0) || ' minutes')"
+    )
+
+
+def _day(row: str) -> str:
+    return f"COALESCE({row}.local_day, {_fallback_day(row)})"
+
+
+def _month(row: str) -> str:
+    return f"substr({_day(row)}, 1, 8) || '01'"
+
+
+def _add(row: str) -> str:
+    return f"""
+    INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+    VALUES ({row}.user_id, COALESCE({row}.bucket_id, 0), {_month(row)}, {row}.amount, 1)
+    ON CONFLICT (user_id, month_start, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+    VALUES ({row}.user_id, COALESCE({row}.bucket_id, 0), {_day(row)}, {row}.amount, 1)
+    ON CONFLICT (user_id, day, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+"""
+
+
+def _remove(row: str) -> str:
+    return f"""
+    UPDATE bucket_month_spend
+    SET total_amount = total_amount - {row}.amount, purchase_count = purchase_count - 1
+    WHERE user_id = {row}.user_id
+    AND bucket_id = COALESCE({row}.bucket_id, 0)
+    AND month_start = {_month(row)};
+
+    UPDATE bucket_day_spend
+    SET total_amount = total_amount - {row}.amount, purchase_count = purchase_count - 1
+    WHERE user_id = {row}.user_id
+    AND bucket_id = COALESCE({row}.bucket_id, 0)
+    AND day = {_day(row)};
+"""
+
+
+_CLEAN_UP = """
+    DELETE FROM bucket_month_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+    DELETE FROM bucket_day_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+"""
+
+
+def backfill_local_days(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT purchase_id, purchased_at, timezone FROM purchase;")
+    zones = {}
+    days = []
+    for purchase_id, purchased_at, timezone_name in cursor.fetchall():
+        if timezone_name not in zones:
+            try:
+                zones[timezone_name] = ZoneInfo(timezone_name)
+            except (ZoneInfoNotFoundError, ValueError):
+                # left NULL, the triggers fall back to timezone_offset for it
+                zones[timezone_name] = None
+        zone = zones[timezone_name]
+        if zone is not None:
+            day = datetime.fromtimestamp(purchased_at, timezone.utc).astimezone(zone).strftime("%Y-%m-%d")
+            days.append((day, purchase_id))
+    cursor.executemany("UPDATE purchase SET local_day = ? WHERE purchase_id = ?;", days)
+
+
+steps = [
+    step("ALTER TABLE purchase ADD COLUMN local_day TEXT;"),
+    step(backfill_local_days),
+
+    step("DROP TRIGGER purchase_spend_after_insert;"),
+    step("DROP TRIGGER purchase_spend_after_delete;"),
+    step("DROP TRIGGER purchase_spend_after_update;"),
+
+    step(f"""
+CREATE TRIGGER purchase_spend_after_insert AFTER INSERT ON purchase
+BEGIN{_add("NEW")}END;
+"""),
+    step(f"""
+CREATE TRIGGER purchase_spend_after_delete AFTER DELETE ON purchase
+BEGIN{_remove("OLD")}{_CLEAN_UP}END;
+"""),
+    step(f"""
+CREATE TRIGGER purchase_spend_after_update AFTER UPDATE OF amount, purchased_at, timezone, local_day, user_id, bucket_id ON purchase
+BEGIN{_remove("OLD")}{_add("NEW")}{_CLEAN_UP}END;
+"""),
+
+    # the summaries were bucketed by the fixed offsets until now
+    step("DELETE FROM bucket_month_spend;"),
+    step("DELETE FROM bucket_day_spend;"),
+    step(f"""
+INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+SELECT p.user_id, COALESCE(p.bucket_id, 0), {_month("p")}, SUM(p.amount), COUNT(*)
+FROM purchase AS p
+GROUP BY 1, 2, 3;
+"""),
+    step(f"""
+INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+SELECT p.user_id, COALESCE(p.bucket_id, 0), {_day("p")}, SUM(p.amount), COUNT(*)
+FROM purchase AS p
+GROUP BY 1, 2, 3;
+"""),
+]
@@ -0,0 +1,10 @@
+CREATE TABLE bucket_day_spend (
+    user_id INTEGER NOT NULL,
+    bucket_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    total_amount INTEGER NOT NULL DEFAULT 0,
+    purchase_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, bucket_id)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_bucket_day_spend_bucket_day ON bucket_day_spend(bucket_id, day);
@@ -0,0 +1,10 @@
+CREATE TABLE bucket_month_spend (
+    user_id INTEGER NOT NULL,
+    bucket_id INTEGER NOT NULL,
+    month_start TEXT NOT NULL,
+    total_amount INTEGER NOT NULL DEFAULT 0,
+    purchase_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month_start, bucket_id)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_bucket_month_spend_bucket_month ON bucket_month_spend(bucket_id, month_start);
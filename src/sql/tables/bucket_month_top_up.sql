@@ -9,3 +9,26 @@ CREATE TABLE bucket_month_top_up (
                 FOREIGN KEY(bucket_id) REFERENCES bucket(bucket_id) ON DELETE CASCADE,
                 CONSTRAINT unique_bucket_month UNIQUE(bucket_id, month_start)
             );
+
+CREATE TRIGGER user_data_version_top_up_insert
+AFTER INSERT ON bucket_month_top_up
+BEGIN
+    UPDATE user SET data_version = data_version + 1
+    WHERE user_id = (SELECT user_id FROM category WHERE category_id = NEW.bucket_id);
+END;
+
+CREATE TRIGGER user_data_version_top_up_update
+AFTER UPDATE ON bucket_month_top_up
+BEGIN
+    UPDATE user SET data_version = data_version + 1
+    WHERE user_id IN (
+        SELECT user_id FROM category WHERE category_id IN (OLD.bucket_id, NEW.bucket_id)
+    );
+END;
+
+CREATE TRIGGER user_data_version_top_up_delete
+AFTER DELETE ON bucket_month_top_up
+BEGIN
+    UPDATE user SET data_version = data_version + 1
+    WHERE user_id = (SELECT user_id FROM category WHERE category_id = OLD.bucket_id);
+END;
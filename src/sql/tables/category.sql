@@ -6,3 +6,23 @@ CREATE TABLE IF NOT EXISTS "category"(
             user_id INTEGER NOT NULL,
             FOREIGN KEY(user_id) REFERENCES user(user_id) ON DELETE CASCADE
             );
+
+CREATE INDEX idx_category_user_is_daily ON category(user_id, is_daily);
+
+CREATE TRIGGER user_data_version_category_insert
+AFTER INSERT ON category
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id = NEW.user_id;
+END;
+
+CREATE TRIGGER user_data_version_category_update
+AFTER UPDATE ON category
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id IN (OLD.user_id, NEW.user_id);
+END;
+
+CREATE TRIGGER user_data_version_category_delete
+AFTER DELETE ON category
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id = OLD.user_id;
+END;
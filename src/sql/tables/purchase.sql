@@ -3,12 +3,100 @@ CREATE TABLE purchase(
             amount INTEGER NOT NULL,
             currency TEXT NOT NULL,
             lotto_number TEXT,
-            purchased_at TEXT NOT NULL,
+            purchased_at INTEGER NOT NULL,
             timezone TEXT NOT NULL,
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
             updated_at TEXT,
             user_id INTEGER NOT NULL,
-            bucket_id INTEGER NOT NULL,
+            bucket_id INTEGER,
+            local_day TEXT,
             FOREIGN KEY(user_id) REFERENCES user(user_id) ON DELETE CASCADE,
-            FOREIGN KEY(bucket_id) REFERENCES bucket(bucket_id) ON DELETE CASCADE
+            FOREIGN KEY(bucket_id) REFERENCES category(category_id) ON DELETE CASCADE
         );
+
+CREATE INDEX idx_purchase_user_purchased_at
+ON purchase(user_id, purchased_at, amount);
+
+CREATE INDEX idx_purchase_bucket_purchased_at
+ON purchase(bucket_id, purchased_at, amount);
+
+CREATE TRIGGER purchase_spend_after_insert AFTER INSERT ON purchase
+BEGIN
+    INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+    VALUES (NEW.user_id, COALESCE(NEW.bucket_id, 0), substr(COALESCE(NEW.local_day, strftime('%Y-%m-%d', NEW.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes')), 1, 8) || '01', NEW.amount, 1)
+    ON CONFLICT (user_id, month_start, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+    VALUES (NEW.user_id, COALESCE(NEW.bucket_id, 0), COALESCE(NEW.local_day, strftime('%Y-%m-%d', NEW.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes')), NEW.amount, 1)
+    ON CONFLICT (user_id, day, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+END;
+
+CREATE TRIGGER purchase_spend_after_delete AFTER DELETE ON purchase
+BEGIN
+    UPDATE bucket_month_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND month_start = substr(COALESCE(OLD.local_day, strftime('%Y-%m-%d', OLD.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes')), 1, 8) || '01';
+
+    UPDATE bucket_day_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND day = COALESCE(OLD.local_day, strftime('%Y-%m-%d', OLD.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes'));
+
+    DELETE FROM bucket_month_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+    DELETE FROM bucket_day_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+END;
+
+CREATE TRIGGER purchase_spend_after_update AFTER UPDATE OF amount, purchased_at, timezone, local_day, user_id, bucket_id ON purchase
+BEGIN
+    UPDATE bucket_month_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND month_start = substr(COALESCE(OLD.local_day, strftime('%Y-%m-%d', OLD.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes')), 1, 8) || '01';
+
+    UPDATE bucket_day_spend
+    SET total_amount = total_amount - OLD.amount, purchase_count = purchase_count - 1
+    WHERE user_id = OLD.user_id
+    AND bucket_id = COALESCE(OLD.bucket_id, 0)
+    AND day = COALESCE(OLD.local_day, strftime('%Y-%m-%d', OLD.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = OLD.timezone), 0) || ' minutes'));
+
+    INSERT INTO bucket_month_spend (user_id, bucket_id, month_start, total_amount, purchase_count)
+    VALUES (NEW.user_id, COALESCE(NEW.bucket_id, 0), substr(COALESCE(NEW.local_day, strftime('%Y-%m-%d', NEW.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes')), 1, 8) || '01', NEW.amount, 1)
+    ON CONFLICT (user_id, month_start, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    INSERT INTO bucket_day_spend (user_id, bucket_id, day, total_amount, purchase_count)
+    VALUES (NEW.user_id, COALESCE(NEW.bucket_id, 0), COALESCE(NEW.local_day, strftime('%Y-%m-%d', NEW.purchased_at, 'unixepoch', COALESCE((SELECT offset_minutes FROM timezone_offset WHERE timezone = NEW.timezone), 0) || ' minutes')), NEW.amount, 1)
+    ON CONFLICT (user_id, day, bucket_id) DO UPDATE SET
+        total_amount = total_amount + excluded.total_amount,
+        purchase_count = purchase_count + 1;
+
+    DELETE FROM bucket_month_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+    DELETE FROM bucket_day_spend WHERE user_id = OLD.user_id AND purchase_count = 0;
+END;
+
+CREATE TRIGGER user_data_version_purchase_insert
+AFTER INSERT ON purchase
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id = NEW.user_id;
+END;
+
+CREATE TRIGGER user_data_version_purchase_update
+AFTER UPDATE ON purchase
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id IN (OLD.user_id, NEW.user_id);
+END;
+
+CREATE TRIGGER user_data_version_purchase_delete
+AFTER DELETE ON purchase
+BEGIN
+    UPDATE user SET data_version = data_version + 1 WHERE user_id = OLD.user_id;
+END;
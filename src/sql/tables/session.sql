@@ -5,3 +5,7 @@ CREATE TABLE IF NOT EXISTS "session" (
                 expires_at INTEGER NOT NULL,
                 FOREIGN KEY(user_id) REFERENCES user(user_id)
             );
+
+CREATE UNIQUE INDEX idx_session_token ON session(token);
+
+CREATE INDEX idx_session_expires_at ON session(expires_at);
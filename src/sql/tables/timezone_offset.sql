@@ -0,0 +1,4 @@
+CREATE TABLE timezone_offset (
+    timezone TEXT PRIMARY KEY,
+    offset_minutes INTEGER NOT NULL
+) WITHOUT ROWID;
@@ -1,5 +1,6 @@
 CREATE TABLE user (
             user_id INTEGER PRIMARY KEY AUTOINCREMENT,
             email TEXT UNIQUE NOT NULL,
-            hashed_password TEXT
+            hashed_password TEXT,
+            data_version INTEGER NOT NULL DEFAULT 0
         );
@@ -0,0 +1,36 @@
+""" Long running background tasks started from the app lifespan """
+import asyncio
+import logging
+import os
+import time
+
+from src.respository.session import delete_expired_sessions_async
+
+logger = logging.getLogger(__name__)
+
+SESSION_REAP_INTERVAL = int(os.getenv("SESSION_REAP_INTERVAL", "600"))
+SESSION_REAP_BATCH_SIZE = int(os.getenv("SESSION_REAP_BATCH_SIZE", "500"))
+
+
+async def reap_expired_sessions(interval: int = SESSION_REAP_INTERVAL, batch_size: int = SESSION_REAP_BATCH_SIZE):
+    """
+    Deletes expired sessions in batches of batch_size every interval seconds.
+    Small batches keep each write transaction short so requests never wait long on the writer.
+    """
+    while True:
+        try:
+            total_deleted = 0
+            while True:
+                deleted = await delete_expired_sessions_async(now=int(time.time()), limit=batch_size)
+                total_deleted += deleted
+                if deleted < batch_size:
+                    break
+                # let other writers in between batches
+                await asyncio.sleep(0)
+
+            if total_deleted:
+                logger.info(f"reaped {total_deleted} expired sessions")
+        except Exception as e:
+            logger.error(f"error reaping expired sessions: {e}", exc_info=True)
+
+        await asyncio.sleep(interval)
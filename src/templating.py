@@ -0,0 +1,109 @@
+""" The shared Jinja environment and template rendering helpers """
+import os
+from typing import Iterable, Iterator, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from src.assets import asset, srcset
+
+TEMPLATES_DIR = "templates"
+# in prod templates only change on deploy, so don't stat() them on every render
+TEMPLATE_AUTO_RELOAD = os.getenv("ENVIRONMENT", "dev") != "prod"
+# compiled templates are kept here between restarts, empty turns it off
+TEMPLATE_BYTECODE_CACHE_DIR = os.getenv("TEMPLATE_BYTECODE_CACHE_DIR", ".jinja_cache")
+# rendered output is flushed to the client every time this many bytes have built up
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "4096"))
+
+
+def _bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    if not TEMPLATE_BYTECODE_CACHE_DIR:
+        return None
+
+    os.makedirs(TEMPLATE_BYTECODE_CACHE_DIR, exist_ok=True)
+    return FileSystemBytecodeCache(TEMPLATE_BYTECODE_CACHE_DIR)
+
+
+# every controller renders through this one environment and its template cache
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=True,
+        auto_reload=TEMPLATE_AUTO_RELOAD,
+        bytecode_cache=_bytecode_cache(),
+        cache_size=-1
+    )
+)
+templates.env.globals.update(asset=asset, srcset=srcset)
+
+
+def precompile_templates() -> int:
+    """
+    Loads every template up front so nothing is compiled on a first request after a deploy.
+    Run at startup. Returns how many templates were loaded.
+    """
+    names = templates.env.list_templates(extensions=["html", "xml"])
+    for name in names:
+        templates.get_template(name)
+
+    return len(names)
+
+
+def _encode_chunks(parts: Iterable[str], chunk_size: int, closing: list) -> Iterator[bytes]:
+    """
+    Jinja yields lots of tiny strings, so join them into chunks before they hit the socket.
+    Anything in closing (e.g. repository iterators holding a pooled connection) is closed
+    once rendering finishes, fails or the client goes away.
+    """
+    buffer = []
+    buffered = 0
+    try:
+        for part in parts:
+            buffer.append(part)
+            buffered += len(part)
+            if buffered >= chunk_size:
+                yield "".join(buffer).encode("utf-8")
+                buffer.clear()
+                buffered = 0
+
+        if buffer:
+            yield "".join(buffer).encode("utf-8")
+    finally:
+        for iterator in closing:
+            iterator.close()
+
+
+def stream_template(
+        templates: Jinja2Templates,
+        request: Request,
+        name: str,
+        context: Optional[dict] = None,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: str = "text/html",
+        chunk_size: int = STREAM_CHUNK_SIZE
+        ) -> StreamingResponse:
+    """
+    Like templates.TemplateResponse, but renders with Jinja's generate() so the page
+    goes out as it's produced instead of being built in memory first.
+
+    Context values can be generators (e.g. purchase_repository.iter_for_period);
+    they're consumed while the template renders, in a worker thread, not on the event loop.
+    Templates should use {% for %}...{% else %} rather than {% if items %} on them.
+    """
+    context = dict(context or {})
+    context.setdefault("request", request)
+    for processor in templates.context_processors:
+        context.update(processor(request))
+
+    closing = [value for value in context.values() if hasattr(value, "close") and isinstance(value, Iterator)]
+    parts = templates.get_template(name).generate(context)
+
+    return StreamingResponse(
+        _encode_chunks(parts, chunk_size, closing),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type
+    )
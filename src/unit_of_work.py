@@ -0,0 +1,99 @@
+""" Per-request unit of work: an identity map and pooled reads shared by dependencies and handlers """
+from contextlib import contextmanager
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request
+
+from src.config import pool
+from src.executor import db_executor
+
+
+class UnitOfWork:
+    """
+    While the unit of work is bound every pool.reader() in the request goes through borrow(),
+    whichever thread asks, so the request uses one pooled reader at a time. The reader goes
+    back to the pool as soon as the outermost borrow() exits: it's never held across an await,
+    where it would wait on database threads that are themselves waiting for a reader.
+    Entities loaded through get() are kept by (kind, key), so e.g. the purchase an
+    ownership check loaded is the one the handler gets, without another query.
+    Writes still go through the write queue; evict() whatever a handler changed.
+    """
+
+    def __init__(self):
+        self.closed = False
+        self.loads = 0
+        self.hits = 0
+        self._conn = None
+        self._lock = threading.RLock()
+        self._identity: Dict[Tuple[str, Hashable], Any] = {}
+
+    @contextmanager
+    def borrow(self):
+        """A pooled reader for the request, one user at a time; nested borrows share it"""
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("unit of work is closed")
+            if self._conn is not None:
+                yield self._conn
+                return
+
+            self._conn = pool._acquire_reader()
+            try:
+                yield self._conn
+            finally:
+                pool._release_reader(self._conn)
+                self._conn = None
+
+    def get(self, kind: str, key: Hashable, load: Callable) -> Optional[Any]:
+        """
+        The (kind, key) entity, loaded with load(conn, key) the first time it's asked for.
+        A tuple key is passed as separate arguments, load(conn, *key).
+        """
+        with self._lock:
+            if (kind, key) in self._identity:
+                self.hits += 1
+                return self._identity[(kind, key)]
+
+            with self.borrow() as conn:
+                entity = load(conn, *key) if isinstance(key, tuple) else load(conn, key)
+            self.loads += 1
+            self._identity[(kind, key)] = entity
+            return entity
+
+    async def get_async(self, kind: str, key: Hashable, load: Callable) -> Optional[Any]:
+        # a hit is answered on the event loop, only a load goes to the database threads
+        if (kind, key) in self._identity:
+            self.hits += 1
+            return self._identity[(kind, key)]
+        return await db_executor.run(self.get, kind, key, load)
+
+    def add(self, kind: str, key: Hashable, entity: Any):
+        with self._lock:
+            self._identity[(kind, key)] = entity
+
+    def evict(self, kind: str, key: Hashable):
+        with self._lock:
+            self._identity.pop((kind, key), None)
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._identity.clear()
+            if self._conn is not None:
+                pool._release_reader(self._conn)
+                self._conn = None
+
+
+async def get_unit_of_work(request: Request):
+    """
+    Yield dependency. FastAPI runs it once per request however many dependencies ask for it,
+    and it's also left on request.state.uow for handlers.
+    """
+    uow = UnitOfWork()
+    request.state.uow = uow
+    with pool.bind_reader(uow):
+        try:
+            yield uow
+        finally:
+            uow.close()
@@ -1,31 +1,264 @@
-from datetime import datetime, timedelta, timezone
-from typing import Tuple
+import calendar
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+import threading
+from typing import Dict, Iterable, Optional, Tuple, Union
 from zoneinfo import ZoneInfo
 
+LOCAL_TIMEZONE = "Asia/Taipei"
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
 
 def get_local_today():
     """
     Returns todays date localized to the user's timezone
     """
     today_utc = datetime.now(timezone.utc)
-    return today_utc.astimezone(ZoneInfo("Asia/Taipei"))
+    return today_utc.astimezone(ZoneInfo(LOCAL_TIMEZONE))
+
+
+@dataclass(frozen=True)
+class Period:
+    """A run of whole local days and the UTC instants it covers. The ends are exclusive."""
+    first_day: date
+    days: int
+    local_start: datetime
+    local_end: datetime
+    utc_start: datetime
+    utc_end: datetime
 
+    @property
+    def last_day(self) -> date:
+        return self.first_day + timedelta(days=self.days - 1)
 
-def get_today_utc_range(local_today: datetime) -> Tuple[datetime, datetime]:
+
+class BoundaryService:
     """
-    Returns a tuple like start_of_period, end_of_period.
-    Takes your local range and 
+    Start and end of local days and months in UTC, worked out once and cached.
+    Midnight is found through zoneinfo for the date itself, so days that are 23 or 25
+    hours long around DST changes come out right.
+    today() and this_month() are kept per zone until the local date rolls over.
     """
-    local_start_of_day = local_today.replace(hour=0, minute=0, second=0)
-    utc_start_of_day =  local_start_of_day.astimezone(timezone.utc)
 
-    local_start_of_tomorrow = local_start_of_day + timedelta(days=1)
-    utc_start_of_tomorrow =  local_start_of_tomorrow.astimezone(timezone.utc) 
+    def __init__(self, max_size: int = 1024):
+        self.day = lru_cache(maxsize=max_size)(self._day)
+        self.month = lru_cache(maxsize=max_size)(self._month)
+        self.span = lru_cache(maxsize=max_size)(self._span)
+        self._lock = threading.Lock()
+        self._today: Dict[str, Tuple[float, Period]] = {}
+        self._this_month: Dict[str, Tuple[float, Period]] = {}
+
+    def _span(self, zone_name: str, first_day: date, last_day: date) -> Period:
+        zone = get_zone(zone_name)
+        days = (last_day - first_day).days + 1
+        local_start = datetime.combine(first_day, time.min, tzinfo=zone)
+        local_end = datetime.combine(first_day + timedelta(days=days), time.min, tzinfo=zone)
+        return Period(
+            first_day=first_day,
+            days=days,
+            local_start=local_start,
+            local_end=local_end,
+            utc_start=local_start.astimezone(timezone.utc),
+            utc_end=local_end.astimezone(timezone.utc),
+        )
+
+    def _day(self, zone_name: str, local_date: date) -> Period:
+        return self.span(zone_name, local_date, local_date)
+
+    def _month(self, zone_name: str, month_start: date) -> Period:
+        month_start = month_start.replace(day=1)
+        days = calendar.monthrange(month_start.year, month_start.month)[1]
+        return self.span(zone_name, month_start, month_start + timedelta(days=days - 1))
+
+    def _current(self, cache: Dict[str, Tuple[float, Period]], zone_name: str, build) -> Period:
+        now = datetime.now(timezone.utc)
+        cached = cache.get(zone_name)
+        if cached is not None and now.timestamp() < cached[0]:
+            return cached[1]
+
+        local_date = now.astimezone(get_zone(zone_name)).date()
+        period = build(zone_name, local_date)
+        # recheck once the local date rolls over
+        expires_at = self.day(zone_name, local_date).utc_end.timestamp()
+        with self._lock:
+            cache[zone_name] = (expires_at, period)
+        return period
+
+    def today(self, zone_name: str = LOCAL_TIMEZONE) -> Period:
+        return self._current(self._today, zone_name, self.day)
+
+    def this_month(self, zone_name: str = LOCAL_TIMEZONE) -> Period:
+        return self._current(self._this_month, zone_name, self.month)
+
+    def clear(self):
+        self.day.cache_clear()
+        self.month.cache_clear()
+        self.span.cache_clear()
+        with self._lock:
+            self._today.clear()
+            self._this_month.clear()
+
+
+boundaries = BoundaryService()
 
-    return utc_start_of_day, utc_start_of_tomorrow
 
 def get_form_default_date_time(local_today: datetime):
     return local_today.date(), local_today.time().strftime("%H:%M:%S")
 
 def combine_date_time(date_str, time_str):
     return datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M:%S")
+
+
+@lru_cache(maxsize=None)
+def get_zone(zone_name: str) -> ZoneInfo:
+    return ZoneInfo(zone_name)
+
+
+@lru_cache(maxsize=4096)
+def get_day_offset(zone_name: str, utc_day: int) -> Optional[int]:
+    """
+    The zone's UTC offset in seconds for a whole UTC day (days since the epoch),
+    or None when the offset changes during that day (a DST transition).
+    """
+    zone = get_zone(zone_name)
+    day_start = utc_day * SECONDS_PER_DAY
+    offsets = {
+        int(datetime.fromtimestamp(day_start + seconds, zone).utcoffset().total_seconds())
+        for seconds in (0, SECONDS_PER_DAY // 2, SECONDS_PER_DAY - 1)
+    }
+    return offsets.pop() if len(offsets) == 1 else None
+
+
+@lru_cache(maxsize=4096)
+def _civil_date(local_day: int) -> Tuple[int, int, int]:
+    day = date.fromordinal(local_day + EPOCH_ORDINAL)
+    return day.year, day.month, day.day
+
+
+# calendar.month_abbr/month_name call strftime on every lookup, so take a copy once
+_MONTH_ABBR = tuple(calendar.month_abbr)
+_MONTH_NAME = tuple(calendar.month_name)
+
+# date fields are filled in once per local day, the time fields are left as
+# placeholders for each row (hence the double escaping of literal braces)
+_FORMAT_FIELDS = {
+    "Y": "{0:04d}", "m": "{1:02d}", "d": "{2:02d}",
+    "H": "{3}", "M": "{4}", "S": "{5}",
+    "b": "{6}", "B": "{7}", "%": "%",
+}
+
+
+@lru_cache(maxsize=64)
+def _compile_format(fmt: str) -> Optional[str]:
+    """Turns a strftime format into a str.format template, or None if it uses directives we don't cover"""
+    parts = []
+    chars = iter(fmt)
+    for char in chars:
+        if char != "%":
+            parts.append(char.replace("{", "{{{{").replace("}", "}}}}"))
+            continue
+        field = _FORMAT_FIELDS.get(next(chars, ""))
+        if field is None:
+            return None
+        parts.append(field)
+    return "".join(parts)
+
+
+@lru_cache(maxsize=8192)
+def _day_format(local_day: int, fmt: str) -> Optional[str]:
+    """fmt with the date already filled in for local_day, leaving {0} {1} {2} for hour, minute, second"""
+    template = _compile_format(fmt)
+    if template is None:
+        return None
+
+    year, month, day = _civil_date(local_day)
+    return template.format(
+        year, month, day, "{0:02d}", "{1:02d}", "{2:02d}", _MONTH_ABBR[month], _MONTH_NAME[month]
+    )
+
+
+class LocalTime:
+    """
+    A UTC instant seen in a timezone.
+    Only the integer wall-clock seconds are kept; the aware datetime is built the first time
+    something needs it, and strftime() formats the common directives without building it at all.
+    """
+
+    __slots__ = ("epoch", "zone_name", "local_seconds", "_datetime")
+
+    def __init__(self, epoch: int, zone_name: str, offset: int):
+        self.epoch = epoch
+        self.zone_name = zone_name
+        # shared rather than copied for UTC, there can be a lot of these
+        self.local_seconds = epoch + offset if offset else epoch
+        self._datetime = None
+
+    @property
+    def datetime(self) -> datetime:
+        if self._datetime is None:
+            self._datetime = datetime.fromtimestamp(self.epoch, get_zone(self.zone_name))
+        return self._datetime
+
+    def strftime(self, fmt: str) -> str:
+        local_day, seconds = divmod(self.local_seconds, SECONDS_PER_DAY)
+        day_format = _day_format(local_day, fmt)
+        if day_format is None:
+            return self.datetime.strftime(fmt)
+
+        hour, seconds = divmod(seconds, 3600)
+        minute, second = divmod(seconds, 60)
+        return day_format.format(hour, minute, second)
+
+    def __getattr__(self, name):
+        # date(), time(), hour, isoformat() ... fall through to the real datetime
+        return getattr(self.datetime, name)
+
+    def __str__(self):
+        return str(self.datetime)
+
+
+def to_local(value: Union[datetime, LocalTime, int], zone_name: str) -> LocalTime:
+    """value is an epoch, a LocalTime or an aware datetime"""
+    if isinstance(value, int):
+        epoch = value
+    elif isinstance(value, LocalTime):
+        epoch = value.epoch
+    else:
+        epoch = int(value.timestamp())
+    offset = get_day_offset(zone_name, epoch // SECONDS_PER_DAY)
+    if offset is None:
+        offset = int(datetime.fromtimestamp(epoch, get_zone(zone_name)).utcoffset().total_seconds())
+    return LocalTime(epoch, zone_name, offset)
+
+
+def localize_rows(
+        rows: Iterable,
+        field: str = "purchased_at",
+        zone_field: str = "timezone",
+        zone_name: Optional[str] = None,
+        fmt: Optional[str] = None
+        ):
+    """
+    Converts field on every row (dicts or objects) to local time in one pass.
+    Uses each row's zone_field unless zone_name is given. With fmt the field becomes
+    a preformatted string, otherwise a LocalTime that templates can strftime() as usual.
+    """
+    rows = rows if isinstance(rows, list) else list(rows)
+    for row in rows:
+        is_dict = isinstance(row, dict)
+        value = row[field] if is_dict else getattr(row, field)
+        row_zone = zone_name or (row[zone_field] if is_dict else getattr(row, zone_field))
+
+        local = to_local(value, row_zone)
+        if fmt:
+            local = local.strftime(fmt)
+
+        if is_dict:
+            row[field] = local
+        else:
+            setattr(row, field, local)
+
+    return rows
@@ -0,0 +1,169 @@
+""" Every write goes through one queue, drained by a single writer thread that commits in groups """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import sqlite3
+
+from src.config import pool
+
+logger = logging.getLogger(__name__)
+
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "256"))
+WRITE_GROUP_SIZE = int(os.getenv("WRITE_GROUP_SIZE", "32"))
+# how long the writer waits for more commands before committing a group, 0 only takes
+# what has already queued up while the previous group was being written
+WRITE_GROUP_WAIT_MS = float(os.getenv("WRITE_GROUP_WAIT_MS", "0"))
+
+
+class WriteQueue:
+    """
+    Write commands (fn(conn, ...) callables) are queued on the event loop and applied by one
+    writer thread, up to group_size at a time in a single transaction with one commit.
+    Each command runs in its own savepoint, so one that raises is rolled back and gets its
+    exception without affecting the rest of its group. Callers await their own result.
+    When max_size commands are waiting, submit() waits for room instead of piling up more.
+    """
+
+    def __init__(self, max_size: int, group_size: int, group_wait: float):
+        self.max_size = max_size
+        self.group_size = group_size
+        self.group_wait = group_wait
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self._submitted = 0
+        self._applied = 0
+        self._failed = 0
+        self._groups = 0
+        self._max_group = 0
+        self._full_waits = 0
+        self._full_logged = False
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._task = loop.create_task(self._drain())
+
+    async def submit(self, fn, *args, **kwargs):
+        """Queue fn(conn, *args, **kwargs) and return what it returns once its group commits."""
+        self._ensure_started()
+        future = self._loop.create_future()
+
+        if self._queue.full():
+            self._full_waits += 1
+            if not self._full_logged:
+                self._full_logged = True
+                logger.warning(f"write queue is full ({self.max_size}), writes are waiting for room")
+
+        await self._queue.put((fn, args, kwargs, future))
+        self._submitted += 1
+        return await future
+
+    async def _drain(self):
+        while True:
+            if self._queue.empty():
+                self._full_logged = False
+            group = [await self._queue.get()]
+            if self.group_wait:
+                await asyncio.sleep(self.group_wait)
+            while len(group) < self.group_size:
+                try:
+                    group.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            try:
+                outcomes = await self._loop.run_in_executor(self._thread, self._apply, group)
+            except Exception as e:
+                # the commit itself failed, so none of them were written
+                logger.error(f"committing a group of {len(group)} writes failed: {e}", exc_info=True)
+                outcomes = [(None, e)] * len(group)
+
+            self._groups += 1
+            self._max_group = max(self._max_group, len(group))
+            for (_, _, _, future), (result, error) in zip(group, outcomes):
+                self._queue.task_done()
+                if error is None:
+                    self._applied += 1
+                else:
+                    self._failed += 1
+                # the caller may have been cancelled while it waited
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+    def _apply(self, group) -> list:
+        outcomes = []
+        with pool.writer() as conn:
+            # take the write lock up front rather than upgrading to it halfway through
+            conn.execute("BEGIN IMMEDIATE;")
+            for fn, args, kwargs, future in group:
+                if future.done():
+                    outcomes.append((None, None))
+                    continue
+
+                conn.execute("SAVEPOINT write_command;")
+                try:
+                    result = fn(conn, *args, **kwargs)
+                except Exception as e:
+                    self._rollback_command(conn)
+                    outcomes.append((None, e))
+                else:
+                    self._release_command(conn)
+                    outcomes.append((result, None))
+        return outcomes
+
+    @staticmethod
+    def _release_command(conn: sqlite3.Connection):
+        try:
+            conn.execute("RELEASE write_command;")
+        except sqlite3.OperationalError:
+            # the command ended the transaction itself, its work is already committed
+            pass
+
+    @staticmethod
+    def _rollback_command(conn: sqlite3.Connection):
+        try:
+            conn.execute("ROLLBACK TO write_command;")
+            conn.execute("RELEASE write_command;")
+        except sqlite3.OperationalError:
+            # the command ended the transaction itself, there is nothing left to undo
+            pass
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "submitted": self._submitted,
+            "applied": self._applied,
+            "failed": self._failed,
+            "groups": self._groups,
+            "max_group": self._max_group,
+            "full_waits": self._full_waits,
+        }
+
+    async def close(self):
+        """Waits for everything queued to be written, then stops the writer."""
+        if self._task is not None and not self._task.done() and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._thread.shutdown(wait=True)
+
+
+write_queue = WriteQueue(
+    max_size=WRITE_QUEUE_SIZE,
+    group_size=WRITE_GROUP_SIZE,
+    group_wait=WRITE_GROUP_WAIT_MS / 1000
+)